@@ -6,6 +6,7 @@ import logging
 logging.basicConfig(level=logging.DEBUG)
 
 import os
+import time
 
 import peewee as pw
 import peeweedbevolve  # pylint: disable=unused-import
@@ -17,21 +18,44 @@ from . import web, bot
 logger = logging.getLogger(__name__)
 logging.getLogger('discord').setLevel(logging.INFO)
 
-def connect_database():
-    """establish the connection to the postgresql database"""
-    database = pw.PostgresqlDatabase(
+def connect_database(attempts: int = 10):
+    """
+    setup the connection pool to the postgresql database, and evolve the schema.
+    Retries a few times, as the database might still be starting up.
+    """
+    database = model.db.ReconnectingPooledDatabase(
         database=os.getenv('POSTGRES_DB'),
         user=os.getenv('POSTGRES_USER'),
         password=os.getenv('POSTGRES_PASSWORD'),
         host='database',
         port=5432,
         connect_timeout=2,
+        max_connections=config.database.max_connections,
+        stale_timeout=config.database.stale_timeout,
+        timeout=config.database.checkout_timeout,
     )
 
     model.db.proxy.initialize(database)
 
-    database.connect()
-    database.evolve() # type: ignore
+    for attempt in range(1, attempts + 1):
+        try:
+            database.connect()
+            break
+        except pw.OperationalError as e:
+            if attempt == attempts:
+                raise
+            logger.warning('database not reachable (attempt %d/%d): %s', attempt, attempts, e)
+            time.sleep(2)
+
+    try:
+        model.db.remove_duplicates(database)
+        database.evolve() # type: ignore
+        model.db.create_managed_indexes(database)
+        model.standings.initialize()
+        model.ratings.initialize()
+    finally:
+        # return the connection to the pool, the workers check them out as needed
+        database.close()
 
 
 def main():
@@ -48,6 +72,7 @@ def main():
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
+    bot.get().use_outbox(model.notification.outbox)
     loop.create_task(bot.get().start(config.discord.bot_token))
     web.app.run(loop=loop, host='0.0.0.0', port=5000)
 
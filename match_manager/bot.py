@@ -1,12 +1,223 @@
 """discord-bot related functionalities"""
 
+import asyncio
 import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Protocol
+
 import discord
 
-from . import config
+from . import config, events
+from .util import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# members that are not in the gateway cache are fetched through the REST api (rate-limited!), so remember them
+# for a while -- including the ones that are not on the guild at all.
+MEMBER_CACHE_TTL = 600
+MISSING_MEMBER_TTL = 300
+
+"""
+Delivery of the notifications from the outbox. The outbox is written by the model, together with the changes that
+are announced -- so nothing is lost if the application stops before they are sent. Access to it is provided by the
+model (see model.notification), to avoid import loops.
+"""
+
+@dataclass
+class OutboxMessage:
+    id: int
+    channel_id: str
+    content: str
+    attempts: int  # number of failed attempts so far
+
+
+class OutboxStore(Protocol):
+    """the storage of the pending notifications"""
+    async def fetch_due(self, limit: int) -> list[OutboxMessage]:
+        """
+        the oldest notifications that are due for (another) attempt to send them -- except those of a channel
+        with an earlier notification that is not due yet, e.g. one waiting for its retry, to keep their order
+        """
+    async def mark_sent(self, ids: list[int]) -> None: ...
+    async def mark_failed(self, ids: list[int], error: str, retry_in: float | None, count_attempt: bool = True) -> None:
+        """schedule another attempt in `retry_in` seconds, or with None, give up"""
+
+
+class ChannelApi(Protocol):
+    """posts messages to discord channels -- replaceable by a fake for testing"""
+    async def send(self, channel_id: str, content: str) -> None: ...
+
+
+class RateLimited(Exception):
+    """raised by a ChannelApi if the channel is rate limited"""
+    def __init__(self, retry_after: float):
+        super().__init__(f'rate limited, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class DiscordChannelApi:
+    """the ChannelApi of the bot"""
+    def __init__(self, bot: discord.Bot):
+        self._bot = bot
+
+    async def send(self, channel_id: str, content: str) -> None:
+        channel = self._bot.get_channel(int(channel_id)) or await self._bot.fetch_channel(int(channel_id))
+        try:
+            await channel.send(content)  # type: ignore
+        except discord.HTTPException as e:
+            if e.status == 429:
+                raise RateLimited(float(e.response.headers.get('Retry-After', 5))) from e
+            raise
+
+
+class RateLimitBucket:
+    """a token bucket: bursts of up to `capacity` requests, refilled to `capacity` within `per` seconds"""
+    def __init__(self, capacity: int, per: float):
+        self._capacity = capacity
+        self._rate = capacity / per
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def block(self, seconds: float) -> None:
+        """no more requests for a while, e.g. after being rate limited anyway"""
+        self._tokens = 0
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class NotificationDispatcher:
+    """
+    Drains the outbox in the background: the pending notifications are grouped by channel, and joined into as
+    few discord messages as possible. Requests are limited per channel and globally, to stay clear of the
+    discord rate limits. Failed deliveries are retried with an exponential backoff, and given up after
+    `max_attempts`.
+    """
+    MAX_MESSAGE_LENGTH = 2000  # discord limit
+
+    def __init__(self, store: OutboxStore, channels: ChannelApi, *,
+                 poll_interval: float = 10.0, batch_size: int = 100,
+                 channel_rate: tuple[int, float] = (5, 5.0), global_rate: tuple[int, float] = (40, 1.0),
+                 max_attempts: int = 8, backoff_base: float = 2.0, backoff_max: float = 600.0):
+        self._store = store
+        self._channels = channels
+        self._poll_interval = poll_interval
+        self._batch_size = batch_size
+        self._channel_rate = channel_rate
+        self._channel_buckets: dict[str, RateLimitBucket] = {}
+        self._global_bucket = RateLimitBucket(*global_rate)
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stats = {'notifications_sent': 0, 'messages_sent': 0, 'failures': 0, 'given_up': 0}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        """new notifications are due"""
+        self._wakeup.set()
+
+    def stats(self) -> dict[str, int]:
+        return dict(self._stats)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.drain_once():
+                    pass
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('failed to process the notification outbox')
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+            except TimeoutError:
+                pass
+
+    async def drain_once(self) -> int:
+        """send (or attempt to send) the due notifications, returns their number"""
+        due = await self._store.fetch_due(self._batch_size)
+
+        by_channel = defaultdict[str, list[OutboxMessage]](list)
+        for message in due:
+            by_channel[message.channel_id].append(message)
+
+        await asyncio.gather(*(self._send_to_channel(channel, messages) for channel, messages in by_channel.items()))
+        return len(due)
+
+    def _batches(self, messages: list[OutboxMessage]) -> list[list[OutboxMessage]]:
+        """combine consecutive notifications, as long as they fit into a single discord message"""
+        batches: list[list[OutboxMessage]] = []
+        length = 0
+        for message in messages:
+            if batches and length + 1 + len(message.content) <= self.MAX_MESSAGE_LENGTH:
+                batches[-1].append(message)
+                length += 1 + len(message.content)
+            else:
+                batches.append([message])
+                length = len(message.content)
+        return batches
+
+    async def _send_to_channel(self, channel_id: str, messages: list[OutboxMessage]) -> None:
+        bucket = self._channel_buckets.setdefault(channel_id, RateLimitBucket(*self._channel_rate))
+
+        for batch in self._batches(messages):
+            ids = [m.id for m in batch]
+            content = '\n'.join(m.content for m in batch)[:self.MAX_MESSAGE_LENGTH]
+
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                await self._channels.send(channel_id, content)
+            except RateLimited as e:
+                # not the notifications fault -- try again, without counting it as a failed attempt
+                bucket.block(e.retry_after)
+                await self._store.mark_failed(ids, str(e), e.retry_after, count_attempt=False)
+                return
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._stats['failures'] += 1
+                attempts = max(m.attempts for m in batch) + 1
+                if attempts >= self._max_attempts:
+                    logger.error('giving up on notifications %s for channel %s: %s', ids, channel_id, e)
+                    self._stats['given_up'] += len(batch)
+                    retry_in = None
+                else:
+                    logger.warning('failed to send notifications %s to channel %s: %s', ids, channel_id, e)
+                    retry_in = min(self._backoff_base * 2 ** (attempts - 1), self._backoff_max)
+                await self._store.mark_failed(ids, repr(e), retry_in)
+                return  # keep the order: the remaining ones wait in the outbox until this one is due again
+
+            await self._store.mark_sent(ids)
+            self._stats['messages_sent'] += 1
+            self._stats['notifications_sent'] += len(batch)
+
+
 class MatchManagerBot(discord.Bot):
     """Connects the MatchManager to the league/tournaments discord server"""
     def __init__(self, *args, **kwargs):
@@ -17,6 +228,15 @@ class MatchManagerBot(discord.Bot):
 
         self._admin_guild: discord.Guild
         self._admin_role: discord.Role
+        self._fetched_members = TTLCache[int, discord.Member | None](ttl=MEMBER_CACHE_TTL)
+
+        self._outbox: OutboxStore | None = None
+        self.notifications: NotificationDispatcher | None = None
+        events.notification_queued.add_handler(self._on_notification_queued)
+
+    def use_outbox(self, store: OutboxStore) -> None:
+        """deliver the notifications from this outbox, once connected"""
+        self._outbox = store
 
     async def on_ready(self):
         """called after bot startup"""
@@ -31,6 +251,43 @@ class MatchManagerBot(discord.Bot):
         self._admin_guild = admin_guild
         self._admin_role = admin_role
 
+        # (on_ready is called again after reconnects)
+        if self._outbox is not None and self.notifications is None:
+            self.notifications = NotificationDispatcher(self._outbox, DiscordChannelApi(self))
+            self.notifications.start()
+
+    async def close(self):
+        """stop sending notifications, then disconnect"""
+        if self.notifications is not None:
+            await self.notifications.stop()
+            self.notifications = None
+        await super().close()
+
+    async def _on_notification_queued(self, data: events.NotificationData):
+        if self.notifications is not None:
+            self.notifications.wake()
+
+    def _is_admin_guild(self, guild: discord.Guild) -> bool:
+        return guild.id == config.discord.admin_guild_id
+
+    async def on_member_join(self, member: discord.Member):
+        """a new member on the admin guild"""
+        if self._is_admin_guild(member.guild):
+            self._fetched_members.invalidate(member.id)
+            await events.member_joined.emit(events.MemberData(user_id=str(member.id)))
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """roles, nickname, ... of a member changed"""
+        if self._is_admin_guild(after.guild):
+            self._fetched_members.invalidate(after.id)
+            await events.member_updated.emit(events.MemberData(user_id=str(after.id)))
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        """a member left (or was kicked/banned) -- the raw event is received even if the member was not cached"""
+        if payload.guild_id == config.discord.admin_guild_id:
+            self._fetched_members.invalidate(payload.user.id)
+            await events.member_removed.emit(events.MemberData(user_id=str(payload.user.id)))
+
     async def is_match_manager_admin(self, user_id: int | str) -> bool:
         """
         Returns true if the user_id belongs to a tournament/league admin.
@@ -43,11 +300,32 @@ class MatchManagerBot(discord.Bot):
         logger.debug((user_id, member and member.name, 'is admin?', is_admin))
         return is_admin == True
 
-    async def get_admin_guild_member(self, user_id: int | str) -> discord.Member:
+    async def get_admin_guild_member(self, user_id: int | str) -> discord.Member | None:
         """
-        Returns a member object representing the user in the tournament discord server
+        Returns a member object representing the user in the tournament discord server,
+        or None if the user is not a member.
         """
-        return self._admin_guild.get_member(int(user_id)) or await self._admin_guild.fetch_member(int(user_id))
+        uid = int(user_id)
+        member = self._admin_guild.get_member(uid)
+        if member is not None:
+            return member
+
+        cached = self._fetched_members.lookup(uid)
+        if cached is not TTLCache.MISSING:
+            return cached # type: ignore
+
+        try:
+            member = await self._admin_guild.fetch_member(uid)
+        except discord.NotFound:
+            self._fetched_members.set(uid, None, ttl=MISSING_MEMBER_TTL)
+            return None
+
+        self._fetched_members.set(uid, member)
+        return member
+
+    def member_cache_stats(self) -> dict[str, int]:
+        """statistics of the cache for members fetched through the REST api"""
+        return self._fetched_members.stats()
 
     def get_admin_guild(self) -> discord.Guild:
         """Access the admin guild object"""
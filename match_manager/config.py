@@ -28,6 +28,15 @@ class Discord:
     bot_token: str
     admin_guild_id: int  # id of the discord server that grants admin rights
     admin_role_id: int   # id of the role that grants the admin rights
+    announcement_channel_id: int | None  # channel for match announcements, none to disable them
+
+@dataclass
+class Database:
+    """database access configuration"""
+    max_connections: int  # size of the connection pool, and upper bound of concurrent database operations
+    stale_timeout: int    # seconds after which pooled connections are recycled
+    checkout_timeout: int # seconds to wait for a free connection before giving up
+    event_bus: bool       # share events with other processes through postgres, e.g. for multiple web workers
 
 # a schema to validate the values before constructing the dataclass instances
 schema = {
@@ -52,6 +61,19 @@ schema = {
             'bot_token': { 'type': 'string' },
             'admin_guild_id': { 'type': 'integer'},
             'admin_role_id': { 'type': 'integer' },
+            'announcement_channel_id': { 'type': 'integer', 'required': False, 'nullable': True, 'default': None },
+        },
+    },
+    # optional section, older config files without it use the defaults
+    'database' : {
+        'type': 'dict',
+        'required': False,
+        'default': {},
+        'schema': {
+            'max_connections': { 'type': 'integer', 'min': 1, 'default': 8 },
+            'stale_timeout': { 'type': 'integer', 'min': 1, 'default': 300 },
+            'checkout_timeout': { 'type': 'integer', 'min': 1, 'default': 10 },
+            'event_bus': { 'type': 'boolean', 'default': False },
         },
     },
 }
@@ -67,6 +89,8 @@ if not validator.validate(config):
     logger.error(validator.errors)
     raise ValueError(validator.errors)
 
+# the normalized document, with defaults filled in
+config = validator.document
 
 logger.info('loaded config')
 logger.info(config)
@@ -74,3 +98,4 @@ logger.info(config)
 environment = Environment(**config['environment'])
 webserver = Webserver(**config['webserver'])
 discord = Discord(**config['discord'])
+database = Database(**config['database'])
@@ -3,44 +3,362 @@ Provides an event system, allowing different components to listen to and emit ev
 E.g., a `match.created` event could trigger a discord module to post a message, and notify browsers connected
 to a websocket about the new match as well.
 
+Handlers are run by the `dispatcher`, which isolates them from each other and from the emitter: a handler that
+fails or hangs (e.g. on a slow discord api call) is logged and, after its timeout, abandoned. Events of
+model changes are emitted in the background, so the api request that caused them does not wait for their handlers.
+Listeners, in contrast, are plain functions that are called right away -- for cheap bookkeeping that has to be
+done before the api request returns, like bumping cache versions.
+
+With a `Transport` installed, events are also published to the other processes (e.g. further web workers, or a
+separately running bot), which run their local handlers for them. Event data must thus be json-serializable
+dataclasses.
+
 Note: In order to avoid import loops, data structures for events should be created together with and
       exclusively for the event type -- don't reuse e.g. the pydantic models used for validation of
       model api calls.
 """
 
-from collections.abc import Callable, Coroutine
-from dataclasses import dataclass
-from typing import Generic, TypeVar, Any
+from collections.abc import Callable, Coroutine, Hashable
+from dataclasses import asdict, dataclass
+from typing import Generic, NamedTuple, Protocol, TypeVar, Any
 
 import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+Handler = Callable[[T], Coroutine[Any, Any, None]]
+Listener = Callable[[T], None]
+
+HANDLER_TIMEOUT = 10.0  # seconds, default for all handlers
+
+
+@dataclass
+class _EventStats:
+    emitted: int = 0
+    handled: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def as_dict(self) -> dict[str, int | float]:
+        calls = self.handled + self.failed + self.timed_out
+        return {
+            'emitted': self.emitted,
+            'handled': self.handled,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'avg_latency_ms': round(1000 * self.total_latency / calls, 3) if calls else 0.0,
+            'max_latency_ms': round(1000 * self.max_latency, 3),
+        }
+
+
+class _Job(NamedTuple):
+    event: str
+    handler: Handler
+    timeout: float
+    data: Any
+    emitted_at: float
+
+
+class Dispatcher:
+    """
+    Runs the event handlers.
+
+    - every handler runs with a timeout, and its exceptions are logged instead of reaching the emitter or
+      the other handlers
+    - awaited emissions run the handlers concurrently in the emitting task
+    - background emissions queue the handlers for a bounded pool of worker tasks, and return right away --
+      unless the queue is full, which slows down the emitters instead of growing without limit
+    - per event: number of emissions, handler results and latencies (from emission to completion of the handler)
+    """
+    def __init__(self, workers: int = 8, max_queue: int = 1000) -> None:
+        self.num_workers = workers
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue[_Job] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._max_depth = 0
+        self._stats: dict[str, _EventStats] = {}
+
+    def stats_for(self, event: str) -> _EventStats:
+        if event not in self._stats:
+            self._stats[event] = _EventStats()
+        return self._stats[event]
+
+    async def run_handler(self, job: _Job) -> None:
+        stats = self.stats_for(job.event)
+        try:
+            await asyncio.wait_for(job.handler(job.data), job.timeout)
+            stats.handled += 1
+        except TimeoutError:
+            stats.timed_out += 1
+            logger.error('handler %s for event %s timed out after %ss', job.handler.__qualname__, job.event, job.timeout)
+        except Exception:  # pylint: disable=broad-exception-caught
+            stats.failed += 1
+            logger.exception('handler %s for event %s failed', job.handler.__qualname__, job.event)
+        finally:
+            latency = time.monotonic() - job.emitted_at
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+    async def run_now(self, jobs: list[_Job]) -> None:
+        """run the handlers concurrently, and wait for all of them"""
+        await asyncio.gather(*(self.run_handler(job) for job in jobs))
+
+    async def submit(self, jobs: list[_Job]) -> None:
+        """queue the handlers for the workers"""
+        if self._queue is None:
+            self._start()
+        assert self._queue is not None
+
+        for job in jobs:
+            await self._queue.put(job)
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+
+    def _start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._work(self._queue)) for _ in range(self.num_workers)]
+
+    async def _work(self, queue: asyncio.Queue[_Job]) -> None:
+        while True:
+            job = await queue.get()
+            try:
+                await self.run_handler(job)
+            finally:
+                queue.task_done()
+
+    async def stop(self) -> None:
+        """deliver the coalesced events, wait for the queued handlers to finish, then stop the workers"""
+        if self._queue is not None:
+            await self._queue.join()  # coalescers may receive further events from the queue
+        for coalescer in _coalescers:
+            await coalescer.flush()
+
+        if self._queue is None:
+            return
+
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'workers': len(self._workers),
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'max_queue_depth': self._max_depth,
+            'events': {name: stats.as_dict() for name, stats in self._stats.items()},
+            'coalescers': {c.name: c.stats() for c in _coalescers},
+        }
+
+
+dispatcher = Dispatcher()
+
+
+@dataclass
+class _Pending(Generic[T]):
+    data: T
+    first: float  # time of the first and the latest event for a key
+    last: float
+    task: asyncio.Task | None = None
+
+
+class Coalescer(Generic[T]):
+    """
+    A handler that collects the events per key, e.g. per match id, and passes only the latest one on to the
+    actual handler -- once no further event arrived for `window` seconds, but at the latest `max_delay` seconds
+    after the first one. So a burst of N changes of an entity leads to a single call of the handler.
+    Use through the `coalesce` decorator.
+    """
+    def __init__(self, handler: Handler[T], key: Callable[[T], Hashable], window: float, max_delay: float,
+                 timeout: float = HANDLER_TIMEOUT) -> None:
+        self.name = f'coalesced:{handler.__qualname__}'
+        self.__qualname__ = self.name
+        self._handler = handler
+        self._key = key
+        self._window = window
+        self._max_delay = max_delay
+        self._timeout = timeout
+        self._pending: dict[Hashable, _Pending[T]] = {}
+        self._coalesced = 0  # number of events that were superseded by a later one
+        _coalescers.append(self)
+
+    async def __call__(self, data: T) -> None:
+        key = self._key(data)
+        now = time.monotonic()
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Pending(data, now, now)
+            pending.task = asyncio.create_task(self._deliver_later(key, pending))
+        else:
+            pending.data = data
+            pending.last = now
+            self._coalesced += 1
+
+    async def _deliver_later(self, key: Hashable, pending: _Pending[T]) -> None:
+        while (delay := min(pending.last + self._window, pending.first + self._max_delay) - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+        del self._pending[key]
+        await self._deliver(pending)
+
+    async def _deliver(self, pending: _Pending[T]) -> None:
+        await dispatcher.run_handler(_Job(self.name, self._handler, self._timeout, pending.data, pending.first))
+
+    async def flush(self) -> None:
+        """deliver all pending events right away"""
+        pending, self._pending = list(self._pending.values()), {}
+        for p in pending:
+            assert p.task is not None
+            p.task.cancel()
+        await asyncio.gather(*(self._deliver(p) for p in pending))
+
+    def stats(self) -> dict[str, int]:
+        return {'pending': len(self._pending), 'coalesced': self._coalesced}
+
+
+_coalescers: list[Coalescer] = []
+
+
+def coalesce(key: Callable[[T], Hashable], window: float, max_delay: float, timeout: float = HANDLER_TIMEOUT):
+    """
+    Decorator to coalesce the events for a handler, see `Coalescer`. E.g.:
+
+        @events.match_updated.add_handler
+        @events.coalesce(key=lambda m: m.id, window=0.5, max_delay=2)
+        async def announce(match: events.MatchData): ...
+    """
+    def _coalesce(handler: Handler[T]) -> Coalescer[T]:
+        return Coalescer(handler, key, window, max_delay, timeout)
+    return _coalesce
+
+
+class Transport(Protocol):
+    """publishes events to other processes -- received events are passed to `deliver`"""
+    async def publish(self, event: str, data: dict[str, Any]) -> None:
+        """publish right away"""
+
+    def publish_in_transaction(self, event: str, data: dict[str, Any]) -> None:
+        """publish as part of the current database transaction of the calling worker thread, sent on commit"""
+
+
+_transport: Transport | None = None
+_events: dict[str, "Event"] = {}  # all events, by name
+
+
+def set_transport(transport: Transport | None) -> None:
+    """install (or with None: remove) the transport to other processes"""
+    global _transport  # pylint: disable=global-statement
+    _transport = transport
+
+
+async def deliver(event: str, data: dict[str, Any]) -> None:
+    """run the local handlers for an event received from another process"""
+    if event not in _events:
+        logger.warning('received unknown event %s', event)
+        return
+
+    e = _events[event]
+    payload = e.data_type(**data)
+    e.notify_listeners(payload)
+    await e.emit_local(payload)
+
 
 class Event(Generic[T]):
     """
     A generic event wrapper that allows you to register asynchronous handlers
     that accept an event payload of type T.
     """
-    def __init__(self, group: "EventGroup[T] | None" = None) -> None:
-        self._handlers: list[Callable[[T], Coroutine[Any, Any, None]]] = []
+    def __init__(self, name: str, data_type: type[T], group: "EventGroup[T] | None" = None,
+                 background: bool = False) -> None:
+        """
+        `name` identifies the event, e.g. in the metrics and between processes, and must be unique.
+        Emissions of `background` events do not wait for the handlers, by default.
+        """
+        if name in _events:
+            raise ValueError(f'duplicate event name {name}')
+        _events[name] = self
+
+        self.name = name
+        self.data_type = data_type
+        self._handlers: list[tuple[Handler[T], float]] = []
+        self._listeners: list[Listener[T]] = []
         self.group: EventGroup[T] | None = group
+        self.background = background
 
-    def add_handler(self, handler: Callable[[T], Coroutine[Any, Any, None]]) -> Callable[[T], Coroutine[Any, Any, None]]:
-        """Register an asynchronous handler for this event."""
-        self._handlers.append(handler)
-        return handler
+    def add_handler(self, handler: Handler[T] | None = None, *, timeout: float = HANDLER_TIMEOUT):
+        """
+        Register an asynchronous handler for this event. Can be used as a decorator, with or without
+        a specific timeout: `@event.add_handler` or `@event.add_handler(timeout=30)`.
+        """
+        def _add(handler: Handler[T]) -> Handler[T]:
+            self._handlers.append((handler, timeout))
+            return handler
 
-    async def emit(self, data: T) -> None:
+        return _add if handler is None else _add(handler)
+
+    def add_listener(self, listener: Listener[T]) -> Listener[T]:
         """
-        Emit the event by running all its handlers concurrently.
-        If the event belongs to an EventGroup, also run the groups global handlers.
+        Register a synchronous listener, called as soon as the event is emitted -- for events of model changes,
+        right after the commit, before the api call returns (see `db.emit`). Listeners must not block.
         """
-        tasks = [asyncio.create_task(handler(data)) for handler in self._handlers]
-        if tasks:
-            await asyncio.gather(*tasks)
-        if self.group is not None:
-            await self.group.emit_global(data)
+        self._listeners.append(listener)
+        return listener
+
+    def notify_listeners(self, data: T) -> None:
+        """call the listeners of the event and its group -- errors are logged, not raised"""
+        for listener in self._listeners + (self.group.listeners if self.group is not None else []):
+            try:
+                listener(data)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('listener %s for event %s failed', listener.__qualname__, self.name)
+
+    async def emit(self, data: T, wait: bool | None = None) -> None:
+        """
+        Emit the event by calling all its listeners and running all its handlers -- and if the event belongs to
+        an EventGroup, the groups global ones as well. Errors are logged, not raised.
+        With `wait` (the default unless this is a background event), return once all handlers finished,
+        otherwise as soon as they are queued. Handlers in other processes are never waited for.
+        """
+        self.notify_listeners(data)
+        if _transport is not None:
+            try:
+                await _transport.publish(self.name, asdict(data))  # type: ignore
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('could not publish event %s to other processes', self.name)
+
+        await self.emit_local(data, wait)
+
+    def publish_in_transaction(self, data: T) -> None:
+        """
+        Publish the event to the other processes as part of the current database transaction: it is sent if
+        (and when) the transaction commits, together with the changes. Blocking, for the database workers --
+        see `db.emit`, which also emits the event locally after the commit.
+        """
+        if _transport is not None:
+            _transport.publish_in_transaction(self.name, asdict(data))  # type: ignore
+
+    async def emit_local(self, data: T, wait: bool | None = None) -> None:
+        """run the handlers of the event in this process only, see `emit`"""
+        handlers = self._handlers + (self.group.global_handlers if self.group is not None else [])
+        dispatcher.stats_for(self.name).emitted += 1
+        if not handlers:
+            return
+
+        now = time.monotonic()
+        jobs = [_Job(self.name, handler, timeout, data, now) for handler, timeout in handlers]
+
+        if wait if wait is not None else not self.background:
+            await dispatcher.run_now(jobs)
+        else:
+            await dispatcher.submit(jobs)
 
 
 class EventGroup(Generic[T]):
@@ -49,51 +367,120 @@ class EventGroup(Generic[T]):
     Individual Event[T] objects created by the group will trigger these listeners
     when they are emitted.
     """
-    def __init__(self) -> None:
-        self._global_handlers: list[Callable[[T], Coroutine[Any, Any, None]]] = []
+    def __init__(self, data_type: type[T]) -> None:
+        self.data_type = data_type
+        self.global_handlers: list[tuple[Handler[T], float]] = []
+        self.listeners: list[Listener[T]] = []
+
+    def add_handler(self, handler: Handler[T] | None = None, *, timeout: float = HANDLER_TIMEOUT):
+        """Register a global listener for all events in this group, see `Event.add_handler`."""
+        def _add(handler: Handler[T]) -> Handler[T]:
+            self.global_handlers.append((handler, timeout))
+            return handler
 
-    def add_handler(self, handler: Callable[[T], Coroutine[Any, Any, None]]):
-        """Register a global listener for all events in this group."""
-        self._global_handlers.append(handler)
+        return _add if handler is None else _add(handler)
 
-    async def emit_global(self, data: T) -> None:
-        """Trigger all global listeners concurrently."""
-        tasks = [asyncio.create_task(handler(data)) for handler in self._global_handlers]
-        if tasks:
-            await asyncio.gather(*tasks)
+    def add_listener(self, listener: Listener[T]) -> Listener[T]:
+        """Register a synchronous listener for all events in this group, see `Event.add_listener`."""
+        self.listeners.append(listener)
+        return listener
 
-    def create_event(self) -> Event[T]:
+    def create_event(self, name: str, background: bool = False) -> Event[T]:
         """Create a new Event[T] that is associated with this EventGroup."""
-        return Event[T](self)
+        return Event(name, self.data_type, self, background)
 
 
 
 @dataclass
 class TeamData:
+    id: int
     name: str
 
-team = EventGroup[TeamData]()
-team_created = team.create_event()
-team_updated = team.create_event()
-team_deleted = team.create_event()
+team = EventGroup(TeamData)
+team_created = team.create_event('team.created', background=True)
+team_updated = team.create_event('team.updated', background=True)
+team_deleted = team.create_event('team.deleted', background=True)
+
+
+@dataclass
+class MapData:
+    id: int
+    name: str
+
+game_map = EventGroup(MapData)
+map_created = game_map.create_event('map.created', background=True)
+map_updated = game_map.create_event('map.updated', background=True)
 
 
 @dataclass
 class SeasonData:
+    id: int
     name: str
 
-season = EventGroup[SeasonData]()
-season_created = season.create_event()
+season = EventGroup(SeasonData)
+season_created = season.create_event('season.created', background=True)
 
 
 @dataclass
 class MatchGroupData:
+    id: int
+    season_id: int
     name: str
 
-match_group = EventGroup[MatchGroupData]()
-match_group_created = match_group.create_event()
-match_group_updated = match_group.create_event()
-match_group_deleted = match_group.create_event()
+match_group = EventGroup(MatchGroupData)
+match_group_created = match_group.create_event('match_group.created', background=True)
+match_group_updated = match_group.create_event('match_group.updated', background=True)
+match_group_deleted = match_group.create_event('match_group.deleted', background=True)
+
+
+@dataclass
+class MatchData:
+    id: int
+    season_id: int
+    group_id: int
+    team_a_id: int
+    team_b_id: int
+    state: str  # the MatchState after the change
+
+match = EventGroup(MatchData)
+match_created = match.create_event('match.created', background=True)
+match_updated = match.create_event('match.updated', background=True)  # any change, including state changes and results
+match_deleted = match.create_event('match.deleted', background=True)
+
+
+@dataclass
+class FixturesData:
+    group_id: int
+    season_id: int
+    team_ids: list[int]
+    matches: int  # number of matches created
+
+# the matches of a whole group at once -- a single event instead of one match.created per match
+fixtures_created = Event('fixtures.created', FixturesData, background=True)
+
+
+@dataclass
+class StandingsData:
+    corrected: int  # rows of the standings table that were corrected
+
+standings_rebuilt = Event('standings.rebuilt', StandingsData, background=True)
+
+
+@dataclass
+class RatingsData:
+    matches: int  # number of matches the ratings were recomputed from
+
+ratings_recomputed = Event('ratings.recomputed', RatingsData, background=True)
+
+
+@dataclass
+class MemberData:
+    user_id: str  # discord user id of the member on the admin guild
+
+member = EventGroup(MemberData)
+member_joined = member.create_event('member.joined')
+member_updated = member.create_event('member.updated')  # e.g. roles or display name changed
+member_removed = member.create_event('member.removed')
 
 
 @dataclass
@@ -103,4 +490,11 @@ class AuditData:
     event_type: str
     event_description: str
 
-audit_event = Event[AuditData]()
+audit_event = Event('audit', AuditData)
+
+
+@dataclass
+class NotificationData:
+    channel_id: str  # a discord notification for this channel was put into the outbox
+
+notification_queued = Event('notification.queued', NotificationData, background=True)
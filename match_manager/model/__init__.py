@@ -1 +1 @@
-from . import team, auth, db, user, audit, map as game_map, match as game_match
+from . import team, auth, db, user, audit, notification, map as game_map, match as game_match, dashboard, standings, ratings, stats
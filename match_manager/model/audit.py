@@ -1,34 +1,122 @@
 from datetime import datetime, timezone, tzinfo
+from collections.abc import AsyncIterator
 from typing import Any, Literal
 from functools import wraps
 
+import asyncio
+
 from playhouse.shortcuts import model_to_dict
-from pydantic import BaseModel, field_validator, validate_call
+import peewee as pw
+from pydantic import BaseModel, Field, field_validator, validate_call
 
 import string
 import logging
 
 from match_manager.model.validation import UtcAwareBaseModel
-from match_manager.util import ArgExtractor
+from match_manager.util import ArgExtractor, encode_cursor, decode_cursor
 
 from .db.audit_event import AuditEvent
-from . import auth, db
+from . import auth, db, user
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def create_audit_entry(author: auth.User, event_type: str, event_description: str) -> None:
-    """Create a new audit log entry for an action of an authenticated user."""
+class AuditSink:
+    """
+    Collects audit entries and writes them in batches in the background, to keep the INSERT (and its
+    transaction) off the request path. A batch is written when `max_batch` entries are pending, or at the
+    latest `max_delay` seconds after the first one was queued.
 
-    logger.info((author.id, author.name, event_type, event_description))
+    In `strict` mode, `submit` only returns after the entry has been written -- useful for tests.
+    As long as the sink is not started (e.g. in scripts), entries are written directly.
+    """
+    def __init__(self, max_batch: int = 100, max_delay: float = 1.0, strict: bool = False):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.strict = strict
+        self._queue: asyncio.Queue[tuple[dict, asyncio.Future | None]] | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """start the background writer on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """write all pending entries and stop the background writer"""
+        if self._task is None or self._queue is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    async def submit(self, author: auth.User, event_type: str, event_description: str) -> None:
+        """queue a new audit log entry for an action of an authenticated user"""
+        logger.info((author.id, author.name, event_type, event_description))
+
+        entry = {
+            'author': author.id,
+            'timestamp': datetime.now(timezone.utc),  # the time of the action, not of the write
+            'event_type': event_type,
+            'event_description': event_description,
+        }
+
+        if self._queue is None:
+            await db.run(self._write, [entry])
+            return
+
+        done = asyncio.get_running_loop().create_future() if self.strict else None
+        self._queue.put_nowait((entry, done))
+        if done is not None:
+            await done
+
+    @staticmethod
+    def _write(entries: list[dict]) -> None:
+        with db.proxy.atomic() as txn:
+            AuditEvent.insert_many(entries).execute()
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+
+            # collect more entries, until the batch is full or the first entry waited long enough
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            error: Exception | None = None
+            try:
+                await db.run(self._write, [entry for entry, _ in batch])
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # don't let the writer die -- the entries are still in the log output
+                logger.exception('failed to write %d audit entries', len(batch))
+                error = e
+
+            for _, done in batch:
+                if done is not None and not done.done():
+                    if error is None:
+                        done.set_result(None)
+                    else:
+                        done.set_exception(error)
+                self._queue.task_done()
 
-    with db.proxy.atomic() as txn:
-        e = AuditEvent(
-            author=author.id,
-            event_type=event_type,
-            event_description=event_description
-        )
-        e.save()
+
+sink = AuditSink()
 
 
 class _PydanticFormatter(string.Formatter):
@@ -81,7 +169,7 @@ def log_call(
                 raise
             finally:
                 if do_log:
-                    create_audit_entry(
+                    await sink.submit(
                         author=get_user(*args, **kwargs),
                         event_type=event_type or f"{'.'.join(f.__module__.split('.')[2:])}.{f.__name__}",
                         event_description=formatter.format(description, **values)
@@ -105,10 +193,17 @@ def log_call(
 pydantic models for validation
 """
 
+class AuditAuthor(BaseModel):
+    """Lightweight info about the author of an audit event -- no permissions, just for display."""
+    id: str
+    name: str
+    avatar_url: str | None = None
+
+
 class AuditEventData(UtcAwareBaseModel):
     """Representation of an audit event entry, including extra data for visualization."""
     timestamp: datetime
-    author: auth.User
+    author: AuditAuthor
     event_type: str
     event_description: str
 
@@ -117,26 +212,184 @@ class AuditEventData(UtcAwareBaseModel):
 model operations
 """
 
-@validate_call
-async def fetch_log(before: datetime | None = None, num_entries: int = 10) -> list[AuditEventData]:
-    """Returns the most recent audit events older than the given timestamp."""
+@db.threaded
+def _fetch_events(before: datetime | None, num_entries: int) -> list[AuditEvent]:
+    """load the raw audit events from the database"""
     query = AuditEvent.select().order_by(AuditEvent.timestamp.desc())
     if before is not None:
         query = query.where(AuditEvent.timestamp < before) # type: ignore
-    query = query.limit(num_entries)
+    return list(query.limit(num_entries))
+
+
+async def resolve_authors(user_ids: set[str]) -> dict[str, AuditAuthor]:
+    """
+    name and avatar of the authors, by user id -- through the shared (bounded and cached) lookup of the discord
+    members. Authors may have left the discord.
+    """
+    members = await user.get_users(list(user_ids))
+    return {
+        uid: AuditAuthor(id=uid, name=members[uid].name, avatar_url=members[uid].avatar_url) if uid in members
+        else AuditAuthor(id=uid, name="unknown")
+        for uid in user_ids
+    }
+
+
+@validate_call
+async def fetch_log(before: datetime | None = None, num_entries: int = 10) -> list[AuditEventData]:
+    """Returns the most recent audit events older than the given timestamp."""
+    events = await _fetch_events(before, num_entries)
+    authors = await resolve_authors({e.author for e in events}) # type: ignore
+
+    return [
+        AuditEventData(
+            timestamp=event.timestamp, # type: ignore
+            author=authors[event.author], # type: ignore
+            event_type=event.event_type, # type: ignore
+            event_description=event.event_description # type: ignore
+        )
+        for event in events
+    ]
+
 
-    results: list[AuditEventData] = []
-    for event in query:
-        event: AuditEvent
+class AuditFilter(UtcAwareBaseModel):
+    """
+    Filters for the audit log, all optional and combined.
+    `event_type` matches exactly, or by prefix if it ends with '*' -- e.g. 'match.*'.
+    `text` is a full-text search in the event descriptions (all words must occur).
+    """
+    author: str | None = None
+    event_type: str | None = None
+    text: str | None = None
+    after: datetime | None = None   # timestamp >= after
+    before: datetime | None = None  # timestamp < before
+
+
+class AuditSearchQuery(AuditFilter):
+    """filters and paging parameters for searching the audit log"""
+    cursor: str | None = None
+    limit: int = Field(default=20, ge=1, le=200)
+
+
+class AuditSearchPage(UtcAwareBaseModel):
+    """A page of audit events, newest first, and the cursor to the next page (None if this is the last one)."""
+    events: list[AuditEventData]
+    next_cursor: str | None
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _filtered(q: pw.ModelSelect, query: AuditFilter) -> pw.ModelSelect:
+    """
+    Apply the filters to a query on AuditEvent.
+    The filters match the indexes on AuditEvent and the managed ones in db/_indexes.py.
+    """
+    if query.author is not None:
+        q = q.where(AuditEvent.author == query.author)
+
+    if query.event_type is not None:
+        if query.event_type.endswith('*'):
+            prefix = _escape_like(query.event_type.rstrip('*'))
+            # (spelled out, peewee would turn LIKE into GLOB for sqlite)
+            q = q.where(pw.NodeList((
+                AuditEvent.event_type.cast('text'), pw.SQL('LIKE'), pw.Value(prefix + '%'), pw.SQL("ESCAPE '\\'")
+            )))
+        else:
+            q = q.where(AuditEvent.event_type == query.event_type)
+
+    if query.text:
+        if isinstance(db.proxy.obj, pw.PostgresqlDatabase):
+            q = q.where(pw.Expression(
+                pw.fn.to_tsvector('simple', AuditEvent.event_description), '@@',
+                pw.fn.plainto_tsquery('simple', query.text)
+            ))
+        else:
+            # e.g. sqlite during development
+            q = q.where(AuditEvent.event_description.contains(query.text))
+
+    if query.after is not None:
+        q = q.where(AuditEvent.timestamp >= query.after) # type: ignore
+    if query.before is not None:
+        q = q.where(AuditEvent.timestamp < query.before) # type: ignore
+
+    return q
+
+
+@db.threaded
+def _search_events(query: AuditSearchQuery) -> list[AuditEvent]:
+    """load matching events, newest first. Fetches one more than requested to detect further pages."""
+    q = _filtered(AuditEvent.select(), query)
 
-        user = await auth.get_user_info(event.author) # type: ignore
-        results.append(
+    # keyset pagination, newest first
+    if query.cursor is not None:
+        last_timestamp, last_id = decode_cursor(query.cursor, 2)
+        q = q.where(
+            (AuditEvent.timestamp < last_timestamp) |
+            ((AuditEvent.timestamp == last_timestamp) & (AuditEvent.id < last_id))
+        )
+
+    return list(q.order_by(AuditEvent.timestamp.desc(), AuditEvent.id.desc()).limit(query.limit + 1))
+
+
+@validate_call
+@auth.requires_admin()
+async def search_log(query: AuditSearchQuery, author: auth.User) -> AuditSearchPage:
+    """search the audit log -- admins only"""
+    events = await _search_events(query)
+    has_more = len(events) > query.limit
+    events = events[:query.limit]
+
+    authors = await resolve_authors({e.author for e in events}) # type: ignore
+    last = events[-1] if events else None
+
+    return AuditSearchPage(
+        events=[
             AuditEventData(
                 timestamp=event.timestamp, # type: ignore
-                author=user,
+                author=authors[event.author], # type: ignore
                 event_type=event.event_type, # type: ignore
                 event_description=event.event_description # type: ignore
             )
-        )
+            for event in events
+        ],
+        next_cursor=(
+            # the timestamps are loaded as naive utc datetimes
+            encode_cursor(last.timestamp.replace(tzinfo=timezone.utc).timestamp(), last.id) # type: ignore
+            if has_more and last else None
+        ),
+    )
+
 
-    return results
+EXPORT_CHUNK_SIZE = 1000
+
+@db.threaded
+def _export_chunk(query: AuditFilter, after_id: int) -> list[dict]:
+    q = _filtered(AuditEvent.select(), query)
+    q = q.where(AuditEvent.id > after_id).order_by(AuditEvent.id).limit(EXPORT_CHUNK_SIZE)
+    return list(q.dicts())
+
+
+@auth.requires_admin()
+async def export_log(query: AuditFilter, author: auth.User) -> AsyncIterator[list[dict]]:
+    """
+    All matching audit events as raw rows, oldest first, in chunks -- admins only. The permission is checked
+    right away, the rows are loaded while iterating.
+    """
+    return _export_chunks(query)
+
+
+async def _export_chunks(query: AuditFilter) -> AsyncIterator[list[dict]]:
+    """
+    Every chunk is a separate keyset query on the primary key -- so the memory usage is constant, and no
+    connection or transaction is held between chunks.
+    """
+    last_id = 0
+    while True:
+        rows = await _export_chunk(query, last_id)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        last_id = rows[-1]['id']
@@ -3,9 +3,10 @@ from typing import Optional
 
 from pydantic import BaseModel, validate_call
 
-from match_manager import bot
-from match_manager.util import ArgExtractor
+from match_manager import bot, events
+from match_manager.util import ArgExtractor, TTLCache
 from .db.team import TeamManager, Team
+from . import db
 
 class User(BaseModel):
     """A user-object: A name, id, and permissions"""
@@ -23,12 +24,46 @@ class User(BaseModel):
 
 EmptyUser = User(id="", name="", is_admin=False, is_manager_for_teams=[])
 
+
+@db.threaded
+def _managed_team_ids(user_id: str) -> list[int]:
+    """ids of the teams the user is a manager for"""
+    query = TeamManager.select(TeamManager.team).where(TeamManager.discord_user_id==user_id)
+    return [manager.team_id for manager in query]
+
+
+# user info is resolved for every authenticated request -- cache it for a short while. Entries are invalidated
+# explicitly when team managers change, or the bot sees a member update; the ttl is just the safety net.
+USER_INFO_TTL = 60
+_user_info_cache = TTLCache[str, User](ttl=USER_INFO_TTL)
+
+
+def invalidate_user_info(*user_ids: str | int) -> None:
+    """drop cached user info, e.g. after changing permissions"""
+    for uid in map(str, user_ids):
+        _user_info_cache.invalidate(uid)
+
+
+def user_info_cache_stats() -> dict[str, int]:
+    """hit/miss statistics of the user info cache"""
+    return _user_info_cache.stats()
+
+
+@events.member.add_handler
+async def _on_member_changed(data: events.MemberData) -> None:
+    invalidate_user_info(data.user_id)
+
+
 @validate_call
 async def get_user_info(user_id: str) -> User:
     """Collect information about the user with the given id"""
+    # not cached if invalidated while collecting: the info may already be outdated (e.g. revoked permissions)
+    return await _user_info_cache.get_or_load(user_id, lambda: _collect_user_info(user_id))
+
 
+async def _collect_user_info(user_id: str) -> User:
     is_admin = await bot.get().is_match_manager_admin(user_id)
-    teams = [manager.team_id for manager in TeamManager.select().where(TeamManager.discord_user_id==user_id)]
+    teams = await _managed_team_ids(user_id)
 
     member = await bot.get().get_admin_guild_member(user_id)
     name = "unknown" if member is None else member.display_name
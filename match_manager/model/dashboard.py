@@ -0,0 +1,85 @@
+"""
+Composite reads, which collect everything a page needs in a single call -- e.g. a season with its groups, teams,
+matches and maps. Entities are normalized: they are listed once, by id, and referenced by their ids elsewhere.
+"""
+
+import asyncio
+
+from pydantic import BaseModel, validate_call
+
+from .db.season import Season, MatchGroup, TeamInGroup
+from .map import MapResponse
+from .match import MatchResponse
+from .team import TeamResponse
+from . import db, team, map as game_map, match as game_match
+
+
+"""
+pydantic models for the responses
+"""
+
+class DashboardGroup(BaseModel):
+    """a match group, with the ids of its teams"""
+    id: int
+    name: str
+    team_ids: list[int]
+
+
+class SeasonDashboard(BaseModel):
+    """a season with its groups and matches, and the teams and maps they reference"""
+    id: int
+    name: str
+    groups: list[DashboardGroup]
+    matches: list[MatchResponse]
+    teams: dict[int, TeamResponse]  # members of the groups, and participants of the matches
+    maps: dict[int, MapResponse]    # maps of the matches
+
+
+"""
+model operations
+"""
+
+@db.threaded
+def _load_season_groups(season_id: int) -> tuple[Season, list[DashboardGroup]]:
+    """the season, its groups and their memberships -- with three queries"""
+    season = Season.get_by_id(season_id)
+    groups = {
+        g.id: DashboardGroup(id=g.id, name=g.name, team_ids=[])
+        for g in MatchGroup.select().where(MatchGroup.season == season_id).order_by(MatchGroup.id)  # type: ignore
+    }
+    if groups:
+        memberships = (TeamInGroup
+                       .select(TeamInGroup.group, TeamInGroup.team)
+                       .where(TeamInGroup.group.in_(list(groups)))  # type: ignore
+                       .order_by(TeamInGroup.id)
+                       .tuples())
+        for group_id, team_id in memberships:
+            groups[group_id].team_ids.append(team_id)
+    return season, list(groups.values())
+
+
+@validate_call
+async def get_season_dashboard(season_id: int) -> SeasonDashboard:
+    """
+    A season with everything that belongs to it. The season, groups and matches take four queries, regardless
+    of their number -- the teams and maps come from the in-memory caches.
+    """
+    (season, groups), matches, teams, maps = await asyncio.gather(
+        _load_season_groups(season_id),
+        game_match.list_matches_in_season(season_id),
+        team.get_teams(),
+        game_map.get_maps(),
+    )
+
+    team_ids = {tid for g in groups for tid in g.team_ids}
+    team_ids.update(tid for m in matches for tid in (m.team_a, m.team_b))
+    map_ids = {m.game_map for m in matches if m.game_map is not None}
+
+    return SeasonDashboard.model_construct(
+        id=season.id,
+        name=season.name,
+        groups=groups,
+        matches=matches,
+        teams={t.id: t for t in teams if t.id in team_ids},
+        maps={m.id: m for m in maps if m.id in map_ids},
+    )
@@ -1,2 +1,6 @@
 from ._proxy import db_proxy as proxy
-from . import team, season, audit_event, map as game_map, match as game_match, db_utils
+from ._executor import run, threaded, emit, on_commit, release_connection, shutdown
+from ._database import ReconnectingPooledDatabase
+from ._indexes import create_managed_indexes, remove_duplicates
+from ._event_bus import PostgresEventBus
+from . import team, season, audit_event, event_payload, notification, standing, map as game_map, match as game_match, rating, db_utils
@@ -0,0 +1,42 @@
+"""
+The database connection pool used in production.
+"""
+
+import logging
+
+import peewee as pw
+from playhouse.pool import PooledPostgresqlDatabase
+from playhouse.shortcuts import ReconnectMixin
+
+logger = logging.getLogger(__name__)
+
+
+class ReconnectingPooledDatabase(ReconnectMixin, PooledPostgresqlDatabase):
+    """
+    A pool of postgresql connections, shared by the database worker threads.
+
+    - connections older than `stale_timeout` are recycled when checked out or returned
+    - idle connections are health-checked when checked out, dead ones (e.g. after a postgres restart) are
+      discarded and replaced by new ones
+    - if a connection dies while a query is executed outside of a transaction, the query is retried once on
+      a fresh connection
+    """
+    reconnect_errors = (
+        (pw.OperationalError, 'server closed the connection'),
+        (pw.OperationalError, 'terminating connection'),
+        (pw.OperationalError, 'ssl connection has been closed'),
+        (pw.InterfaceError, 'connection already closed'),
+    )
+
+    def _is_closed(self, conn) -> bool:
+        """health check on checkout"""
+        if super()._is_closed(conn):
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.info('discarding broken database connection')
+            return True
+        return False
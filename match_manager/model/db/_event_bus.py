@@ -0,0 +1,151 @@
+"""
+Transport of events between processes, through postgres LISTEN/NOTIFY.
+
+Every process listens on a dedicated connection (outside of the pool, which it would block forever), watched by
+the event loop -- so no thread is spent on waiting. Events of model changes are published with `pg_notify` in the
+transaction that makes the changes, and postgres delivers them when it commits. Other events are published
+through the pool, in a transaction of their own.
+Notifications are limited to 8000 bytes: larger ones are stored in the EventPayload table, and only a reference
+to them is sent.
+If the listening connection is lost, it is re-established with a backoff. Events published in the meantime are
+missed by this process.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any
+
+import peewee as pw
+import psycopg2
+import psycopg2.extensions
+
+from match_manager import events
+from ._executor import run
+from .event_payload import EventPayload
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFY_PAYLOAD = 7900  # bytes, postgres allows less than 8000
+PAYLOAD_RETENTION = 3600  # seconds to keep large payloads, for slow receivers
+RECONNECT_MAX_DELAY = 30  # seconds
+
+
+class PostgresEventBus(events.Transport):
+    """publish and receive events through notifications on a postgres channel"""
+
+    def __init__(self, database: pw.PostgresqlDatabase, channel: str = 'match_manager_events'):
+        self._database = database
+        self._channel = channel
+        self._origin = uuid.uuid4().hex  # to ignore our own notifications
+        self._conn: psycopg2.extensions.connection | None = None
+        self._fd = -1  # the socket of the connection, which is no longer accessible once the connection is closed
+        self._reconnect: asyncio.Task | None = None
+        self._deliveries = set[asyncio.Task]()
+        self._stopped = False
+
+    def _listen(self) -> psycopg2.extensions.connection:
+        """open the listening connection -- blocking, executed in a thread"""
+        conn = psycopg2.connect(
+            dbname=self._database.database,
+            # detect dead connections even without traffic
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+            **self._database.connect_params,
+        )
+        conn.set_session(autocommit=True)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self._channel}"')
+        return conn
+
+    async def start(self) -> None:
+        """start listening; raises if the database is not available"""
+        self._stopped = False
+        await self._connect()
+
+    async def _connect(self) -> None:
+        conn = await asyncio.to_thread(self._listen)
+        self._conn, self._fd = conn, conn.fileno()
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        logger.info('listening for events on channel %s', self._channel)
+
+    async def stop(self) -> None:
+        """stop listening, and wait for the delivery of received events"""
+        self._stopped = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+            self._reconnect = None
+        self._close()
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    def _close(self) -> None:
+        if self._conn is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._fd)
+        self._conn.close()
+        self._conn = None
+
+    def _on_readable(self) -> None:
+        assert self._conn is not None
+        try:
+            self._conn.poll()
+        except psycopg2.Error as e:
+            logger.warning('lost the event listener connection: %s', e)
+            self._close()
+            self._reconnect = asyncio.create_task(self._reconnect_loop())
+            return
+
+        while self._conn.notifies:
+            notification = self._conn.notifies.pop(0)
+            self._spawn(self._receive(notification.payload))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _reconnect_loop(self) -> None:
+        delay = 1
+        while not self._stopped:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+                self._reconnect = None
+                return
+            except psycopg2.Error as e:
+                logger.warning('could not re-establish the event listener connection: %s', e)
+                delay = min(2 * delay, RECONNECT_MAX_DELAY)
+
+    async def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            if message['origin'] == self._origin:
+                return
+            if 'ref' in message:
+                message = json.loads(await run(self._load_payload, message['ref']))
+            await events.deliver(message['event'], message['data'])
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception('could not deliver the received event %s', payload[:200])
+
+    @staticmethod
+    def _load_payload(ref: int) -> str:
+        return EventPayload.get_by_id(ref).payload
+
+    async def publish(self, event: str, data: dict[str, Any]) -> None:
+        def _publish() -> None:
+            with self._database.atomic():
+                self.publish_in_transaction(event, data)
+        await run(_publish)
+
+    def publish_in_transaction(self, event: str, data: dict[str, Any]) -> None:
+        """send the notification with the current transaction -- executed by a database worker"""
+        payload = json.dumps({'origin': self._origin, 'event': event, 'data': data})
+        if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+            EventPayload.delete().where(EventPayload.timestamp < time.time() - PAYLOAD_RETENTION).execute()
+            ref = EventPayload.insert(timestamp=time.time(), payload=payload).execute()
+            payload = json.dumps({'origin': self._origin, 'event': event, 'ref': ref})
+
+        # delivered on commit, i.e. together with the payload
+        self._database.execute_sql('SELECT pg_notify(%s, %s)', (self._channel, payload))
@@ -0,0 +1,126 @@
+"""
+Runs the synchronous peewee/psycopg2 work off the event loop.
+
+The event loop drives both the webserver and the discord bot, so a blocking query would stall every request
+and the gateway heartbeat. Instead, database work is handed to a bounded pool of worker threads. peewee keeps
+its connection state per thread: every unit of work checks out a connection from the pool for its duration,
+and returns it afterwards.
+
+Events for the changes made by a unit of work are collected while it runs, and emitted on the event loop once
+it completed -- i.e. after its transaction was committed. The same goes for callbacks registered with `on_commit`,
+e.g. to invalidate caches. Other processes are notified by the transaction itself, see `emit`.
+"""
+
+import asyncio
+import contextvars
+import functools
+from collections.abc import Callable, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ParamSpec, TypeVar
+
+from match_manager import config, events
+from ._proxy import db_proxy
+
+P = ParamSpec('P')
+R = TypeVar('R')
+T = TypeVar('T')
+
+_executor: ThreadPoolExecutor | None = None
+
+# the events to emit and callbacks to run after the current unit of work, set for every call to `run`
+_pending_events: contextvars.ContextVar[list[tuple[events.Event, Any]]] = contextvars.ContextVar('_pending_events')
+_pending_callbacks: contextvars.ContextVar[list[Callable[[], None]]] = contextvars.ContextVar('_pending_callbacks')
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """the executor is created lazily, to respect the configuration at the time of first use"""
+    global _executor  # pylint: disable=global-statement
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.database.max_connections, thread_name_prefix='db')
+    return _executor
+
+
+def _unit_of_work(fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """executed in a worker thread: bind a connection to the scope of the task, then do the work"""
+    with db_proxy.connection_context():
+        return fn(*args, **kwargs)
+
+
+async def run(fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Run the (blocking) database operation `fn` in the worker pool, and await its result."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    pending: list[tuple[events.Event, Any]] = []
+    callbacks: list[Callable[[], None]] = []
+    ctx.run(_pending_events.set, pending)
+    ctx.run(_pending_callbacks.set, callbacks)
+
+    call = functools.partial(ctx.run, _unit_of_work, fn, *args, **kwargs)
+    result = await loop.run_in_executor(_get_executor(), call)
+
+    # callbacks first: handlers of the events should already see their effects
+    for callback in callbacks:
+        callback()
+    for event, data in pending:
+        await event.emit_local(data)
+    return result
+
+
+def emit(event: events.Event[T], data: T) -> None:
+    """
+    Emit `event` once the current unit of work completed successfully. Nothing is emitted if it fails,
+    so events are never sent for changes that were rolled back. Its listeners are called on commit, see
+    `on_commit`.
+    The event is published to other processes right away, within the current transaction -- the database
+    delivers it on commit, so it is neither sent for changes that are rolled back, nor lost if this process
+    stops after the commit.
+    """
+    try:
+        _pending_events.get().append((event, data))
+    except LookupError:
+        raise RuntimeError('db.emit can only be used in a unit of work executed through db.run') from None
+    on_commit(functools.partial(event.notify_listeners, data))
+    event.publish_in_transaction(data)
+
+
+def on_commit(callback: Callable[[], None]) -> None:
+    """
+    Call `callback` on the event loop once the current unit of work completed successfully, before the api call
+    that caused it returns -- unlike the handlers of (background) events.
+    """
+    try:
+        _pending_callbacks.get().append(callback)
+    except LookupError:
+        raise RuntimeError('db.on_commit can only be used in a unit of work executed through db.run') from None
+
+
+def threaded(f: Callable[P, R]) -> Callable[P, Coroutine[Any, Any, R]]:
+    """
+    Decorator to turn a synchronous function doing database work into an awaitable one that is executed
+    in the worker pool. Can be combined with the async decorators like `validate_call`, `auth.requires_admin`
+    or `audit.log_call`, as long as it is the innermost one.
+    """
+    @functools.wraps(f)
+    async def _threaded(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await run(f, *args, **kwargs)
+
+    return _threaded
+
+
+def release_connection() -> None:
+    """return the connection of the calling thread (if any) to the pool"""
+    if not db_proxy.is_closed():
+        db_proxy.close()
+
+
+def shutdown() -> None:
+    """wait for pending database work, stop the worker threads and close all pooled connections"""
+    global _executor  # pylint: disable=global-statement
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+    if hasattr(db_proxy.obj, 'close_all'):
+        db_proxy.close_all()
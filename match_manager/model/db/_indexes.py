@@ -0,0 +1,60 @@
+"""
+Postgres-specific indexes that cannot be declared on the peewee models.
+
+peewee-db-evolve only knows plain column indexes, and drops any column index that is not declared on a model.
+Expression indexes are invisible to it, though -- so these are expression indexes, created (if missing) right
+after the schema evolution.
+
+Also the preparation of the data for the unique indexes that were added to existing tables: the evolution fails
+to create them (and with it the startup) if there are rows that violate them.
+"""
+
+import logging
+
+import peewee as pw
+
+logger = logging.getLogger(__name__)
+
+MANAGED_INDEXES: dict[str, str] = {
+    # full-text search in the audit event descriptions
+    'auditevent_description_fts':
+        "CREATE INDEX IF NOT EXISTS auditevent_description_fts ON auditevent "
+        "USING GIN (to_tsvector('simple', event_description))",
+    # prefix search on the event types, e.g. 'match.%' -- text_pattern_ops works independent of the collation
+    'auditevent_event_type_prefix':
+        "CREATE INDEX IF NOT EXISTS auditevent_event_type_prefix ON auditevent "
+        "((event_type::text) text_pattern_ops)",
+}
+
+
+# unique indexes added to existing tables: table -> columns
+UNIQUE_INDEXES_ADDED: dict[str, tuple[str, ...]] = {
+    # update_match_group used to accept the same team twice
+    'teamingroup': ('group_id', 'team_id'),
+}
+
+
+def remove_duplicates(database: pw.Database) -> None:
+    """
+    delete the rows that violate the added unique indexes, keeping the oldest (lowest id) of each set of
+    duplicates -- to be called before the schema evolution
+    """
+    for table, columns in UNIQUE_INDEXES_ADDED.items():
+        if not database.table_exists(table):
+            continue
+
+        cols = ', '.join(columns)
+        cursor = database.execute_sql(
+            f'DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {cols})')
+        if cursor.rowcount:
+            logger.warning('removed %d duplicate rows from %s', cursor.rowcount, table)
+
+
+def create_managed_indexes(database: pw.Database) -> None:
+    """create the managed indexes that do not exist, yet"""
+    if not isinstance(database, pw.PostgresqlDatabase):
+        return
+
+    for name, sql in MANAGED_INDEXES.items():
+        logger.debug('ensure index %s', name)
+        database.execute_sql(sql)
@@ -10,10 +10,15 @@ from ._proxy import db_proxy
 class AuditEvent(pw.Model):
     class Meta:
         database = db_proxy
+        indexes = (
+            # the log of a single author, newest first
+            (('author', 'timestamp'), False),
+        )
+        # see also: _indexes.py, for full-text search and event type prefixes
 
     author = pw.CharField()  # the discord user id of the author of the event
     # TODO: Should we log the users name as well? Might be useful if a user leaves the discord?
 
-    timestamp = pw.TimestampField(utc=True)  # time of audit-event-creation
+    timestamp = pw.TimestampField(utc=True, index=True)  # time of audit-event-creation
     event_type = pw.CharField()  # a short type/name of the event
     event_description = pw.TextField()  # a detailed description of the event
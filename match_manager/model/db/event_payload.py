@@ -0,0 +1,15 @@
+"""
+Event payloads that are too large for a postgres notification, see _event_bus.py
+"""
+
+import peewee as pw
+
+from ._proxy import db_proxy
+
+
+class EventPayload(pw.Model):
+    class Meta:
+        database = db_proxy
+
+    timestamp = pw.TimestampField(utc=True, index=True)  # for the cleanup of old payloads
+    payload = pw.TextField()  # the complete notification, as json
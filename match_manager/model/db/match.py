@@ -80,6 +80,13 @@ class MatchResultState(AutoNameEnum):
 class Match(pw.Model):
     class Meta:
         database = db_proxy
+        indexes = (
+            # matches in planning / waiting for a result, in chronological order
+            (('state', 'match_time'), False),
+            # a teams schedule -- these also serve as the foreign key indexes for team_a and team_b
+            (('team_a', 'match_time'), False),
+            (('team_b', 'match_time'), False),
+        )
 
     id: int  # make pylance happy.
 
@@ -87,8 +94,8 @@ class Match(pw.Model):
     group = pw.ForeignKeyField(season.MatchGroup, backref='matches')
 
     # the two opponents, mandatory fields -- no point in having a match instance without oppents, right?
-    team_a = pw.ForeignKeyField(team.Team)
-    team_b = pw.ForeignKeyField(team.Team)
+    team_a = pw.ForeignKeyField(team.Team, index=False)  # indexed together with match_time, see Meta
+    team_b = pw.ForeignKeyField(team.Team, index=False)
 
     # the date/time of the match, and the current state of the scheduling
     match_time = UTCTimestampField(null=True, default=None)
@@ -0,0 +1,22 @@
+"""
+The outbox of discord notifications, written together with the changes they announce
+"""
+
+import peewee as pw
+
+from ._proxy import db_proxy
+
+
+class Notification(pw.Model):
+    class Meta:
+        database = db_proxy
+
+    channel_id = pw.CharField()  # the discord channel to post to
+    content = pw.TextField()
+    created = pw.TimestampField(utc=True)
+
+    # delivery: the next attempt is due at `next_attempt` -- null once sent, or after giving up
+    attempts = pw.IntegerField(default=0)
+    next_attempt = pw.TimestampField(utc=True, null=True, index=True)
+    sent = pw.TimestampField(utc=True, null=True)
+    last_error = pw.TextField(null=True)
@@ -0,0 +1,45 @@
+"""
+Ratings of the teams per season, and their history -- computed from the match results, see model/ratings.py
+"""
+
+import peewee as pw
+
+from ._proxy import db_proxy
+from .db_utils import UTCTimestampField
+from .match import Match
+from .season import Season
+from .team import Team
+
+
+class TeamRating(pw.Model):
+    """the current rating of a team in a season"""
+    class Meta:
+        database = db_proxy
+        indexes = (
+            # one rating per team and season -- also serves the lookup of a seasons ratings
+            (('season', 'team'), True),
+        )
+
+    season = pw.ForeignKeyField(Season, on_delete='CASCADE', index=False)
+    team = pw.ForeignKeyField(Team, on_delete='CASCADE')
+    rating = pw.DoubleField()
+    matches = pw.IntegerField(default=0)  # number of rated matches
+
+
+class RatingHistory(pw.Model):
+    """the rating of a team after each of its rated matches"""
+    class Meta:
+        database = db_proxy
+        indexes = (
+            # the course of a teams rating in a season, in the order of the matches
+            (('season', 'team', 'match_time', 'match'), False),
+            # the latest rated match of a season, to decide whether a new result can be applied incrementally
+            (('season', 'match_time', 'match'), False),
+        )
+
+    season = pw.ForeignKeyField(Season, on_delete='CASCADE', index=False)
+    team = pw.ForeignKeyField(Team, on_delete='CASCADE')
+    match = pw.ForeignKeyField(Match, on_delete='CASCADE')
+    match_time = UTCTimestampField()  # copied from the match, it defines the order in which results are rated
+    rating = pw.DoubleField()         # after the match
+    delta = pw.DoubleField()
@@ -30,6 +30,10 @@ class TeamInGroup(pw.Model):
     """
     class Meta:
         database = db_proxy
+        indexes = (
+            # a team can only be added once to a group -- also serves as the foreign key index for the group
+            (('group', 'team'), True),
+        )
 
-    group = pw.ForeignKeyField(MatchGroup, on_delete="CASCADE", backref="teams")
+    group = pw.ForeignKeyField(MatchGroup, on_delete="CASCADE", backref="teams", index=False)
     team = pw.ForeignKeyField(Team, on_delete="CASCADE")
@@ -0,0 +1,29 @@
+"""
+The standings of the teams in their match groups -- materialized from the match results, see model/standings.py
+"""
+
+import peewee as pw
+
+from ._proxy import db_proxy
+from .season import MatchGroup
+from .team import Team
+
+
+class Standing(pw.Model):
+    """the accumulated results of a team in a match group"""
+    class Meta:
+        database = db_proxy
+        indexes = (
+            # one row per team and group -- also serves the lookup of a groups standings
+            (('group', 'team'), True),
+        )
+
+    group = pw.ForeignKeyField(MatchGroup, on_delete='CASCADE', index=False)
+    team = pw.ForeignKeyField(Team, on_delete='CASCADE')
+
+    played = pw.IntegerField(default=0)
+    wins = pw.IntegerField(default=0)
+    losses = pw.IntegerField(default=0)
+    caps_for = pw.IntegerField(default=0)
+    caps_against = pw.IntegerField(default=0)
+    points = pw.IntegerField(default=0)
@@ -22,5 +22,5 @@ class TeamManager(pw.Model):
     class Meta:
         database = db_proxy
 
-    discord_user_id = pw.CharField()
+    discord_user_id = pw.CharField(index=True)  # looked up for every authenticated request
     team = pw.ForeignKeyField(Team, on_delete='CASCADE', backref='managers', index=True)
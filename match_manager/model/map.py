@@ -4,13 +4,15 @@
 import uuid
 
 from playhouse.shortcuts import model_to_dict
-from pydantic import BaseModel, Field, validate_call
+from typing import Self
+from pydantic import BaseModel, Field, RootModel, validate_call
 from quart_schema.pydantic import File
 from pathlib import Path
 
 from .db.map import Map
 from . import auth, audit, db
-from .. import config
+from .. import config, events
+from ..util import ReferenceCache
 
 """
 pydantic models for validation
@@ -35,15 +37,52 @@ class MapResponse(BaseModel):
     full_name: str
     image_filename: str | None = Field(default=None)
 
+    @classmethod
+    def from_row(cls, row: dict) -> Self:
+        """fast path for lists: construct the response from a `.dicts()` row of a `Map` query, without validation"""
+        return cls.model_construct(**row)
+
+
+# a list of maps as a single model, so that list endpoints can skip the validation of every entry
+MapResponseList = RootModel[list[MapResponse]]
+
 
 """
 model operations, which use the pydantic validation, manage the database, ...
 """
 
+@db.threaded
+def _load_maps() -> list[MapResponse]:
+    return [MapResponse.from_row(row) for row in Map.select().order_by(Map.id).dicts()] # type: ignore
+
+
+# maps change a few times per season at most -- keep them in memory, the model operations below invalidate
+# the cache, and the map events (also those of other processes) do so as well
+_maps = ReferenceCache(_load_maps, key=lambda m: m.id)
+
+@events.game_map.add_handler
+async def _on_map_changed(_data: events.MapData) -> None:
+    _maps.invalidate()
+
+
+def map_cache_stats() -> dict[str, int]:
+    """size and counters of the map cache"""
+    return _maps.stats()
+
+
 @validate_call
 async def get_maps() -> list[MapResponse]:
-    """fetch all maps from the database"""
-    return list(MapResponse(**model_to_dict(m)) for m in Map.select().order_by(Map.id)) # type: ignore
+    """fetch all maps"""
+    return await _maps.all()
+
+
+@validate_call
+async def get_map(map_id: int) -> MapResponse:
+    """fetch a single map by its id"""
+    m = await _maps.get(map_id)
+    if m is None:
+        raise Map.DoesNotExist(f'map {map_id} does not exist')
+    return m
 
 
 @validate_call
@@ -51,18 +90,22 @@ async def get_maps() -> list[MapResponse]:
 @audit.log_call(description='{map_data}')
 async def create_new_map(map_data: NewMapData, author: auth.User) -> MapResponse:
     """create a new map"""
-    with db.proxy.atomic() as txn:
-        m = Map(short_name=map_data.short_name, full_name=map_data.full_name)
+    m = Map(short_name=map_data.short_name, full_name=map_data.full_name)
 
-        if map_data.image:
-            m.image_filename = uuid.uuid4().hex + '_' + (map_data.image.filename or '')
+    if map_data.image:
+        m.image_filename = uuid.uuid4().hex + '_' + (map_data.image.filename or '')
 
-            storage_path = Path(config.webserver.upload_folder) / "map_images"
-            storage_path.mkdir(parents=True, exist_ok=True)
-            await map_data.image.save(storage_path / m.image_filename)
+        storage_path = Path(config.webserver.upload_folder) / "map_images"
+        storage_path.mkdir(parents=True, exist_ok=True)
+        await map_data.image.save(storage_path / m.image_filename)
 
-        m.save()
+    def _store():
+        with db.proxy.atomic() as txn:
+            m.save()
+            db.on_commit(_maps.invalidate)
+            db.emit(events.map_created, events.MapData(id=m.id, name=m.full_name))
 
+    await db.run(_store)
     return MapResponse(**model_to_dict(m))
 
 
@@ -71,28 +114,36 @@ async def create_new_map(map_data: NewMapData, author: auth.User) -> MapResponse
 @audit.log_call(description='{map_id}: {update}')
 async def update_map_data(map_id: int, update: UpdateMapData, author: auth.User) -> MapResponse:
     """patch an existing map"""
-    with db.proxy.atomic() as txn:
-        m = Map.get_by_id(map_id)
-
-        # if new data is provided in the update, use it -- else keep don't modify
-        m.short_name = update.short_name or m.short_name
-        m.full_name = update.full_name or m.full_name
-
-        m.save()
-
-        if update.image:
+    new_image = None
+    if update.image:
+        # store the new file first, the database only references it
+        new_image = uuid.uuid4().hex + '_' + (update.image.filename or '')
+
+        storage_path = Path(config.webserver.upload_folder) / "map_images"
+        storage_path.mkdir(parents=True, exist_ok=True)
+        await update.image.save(storage_path / new_image)
+
+    def _update() -> tuple[Map, str | None]:
+        with db.proxy.atomic() as txn:
+            m = Map.get_by_id(map_id)
             old_image = m.image_filename
-            m.image_filename = uuid.uuid4().hex + '_' + (update.image.filename or '')
 
-            storage_path = Path(config.webserver.upload_folder) / "map_images"
-            storage_path.mkdir(parents=True, exist_ok=True)
-            await update.image.save(storage_path / m.image_filename)
+            # if new data is provided in the update, use it -- else keep don't modify
+            m.short_name = update.short_name or m.short_name
+            m.full_name = update.full_name or m.full_name
+            m.image_filename = new_image or m.image_filename
 
             m.save()
-            if old_image:
-                try:
-                    (Path(config.webserver.upload_folder) / "map_images" / old_image).unlink()
-                except:
-                    pass
+            db.on_commit(_maps.invalidate)
+            db.emit(events.map_updated, events.MapData(id=m.id, name=m.full_name))
+        return m, old_image
+
+    m, old_image = await db.run(_update)
+
+    if new_image and old_image:
+        try:
+            (Path(config.webserver.upload_folder) / "map_images" / old_image).unlink()
+        except:
+            pass
 
     return MapResponse(**model_to_dict(m))
@@ -1,18 +1,25 @@
 
 from datetime import datetime
+import functools
+from typing import Literal, Self
+import peewee as pw
 from playhouse.shortcuts import model_to_dict
 import logging
 
 from match_manager.model.season import MatchGroup
 from match_manager.model.validation import UtcAwareBaseModel
+from match_manager.util import encode_cursor, decode_cursor
 from .db import match as model, map as game_map, game_match, season
 
-from pydantic import validate_call
+from pydantic import Field, RootModel, validate_call
 
-from match_manager.model import db, auth, audit
+from match_manager import events
+from match_manager.model import db, auth, audit, notification, ratings, standings, stats
 
 logger = logging.getLogger(__name__)
 
+BULK_INSERT_CHUNK_SIZE = 500  # rows per INSERT statement when creating many matches at once
+
 """
 pydantic models for validation
 """
@@ -68,40 +75,147 @@ class MatchResponse(UtcAwareBaseModel):
 
     state: model.MatchState
 
+    @classmethod
+    def from_row(cls, row: dict) -> Self:
+        """
+        Fast path for lists: construct the response from a `.dicts()` row of a `Match` query, without validation.
+        The values come straight from our own database and already have the right types, except for the score.
+        """
+        caps = row['winner_caps']
+        row['winner_caps'] = caps and caps.value
+        return cls.model_construct(**row)
+
+
+# a list of matches as a single model, so that list endpoints can skip the validation of every entry
+MatchResponseList = RootModel[list[MatchResponse]]
+
+
+def _match_responses(query) -> list[MatchResponse]:
+    """trusted conversion of a `Match` query to response objects"""
+    return [MatchResponse.from_row(row) for row in query.dicts()]
+
+
+def _match_event(m: model.Match) -> events.MatchData:
+    """event data of a match (loads the group, for the season id)"""
+    return events.MatchData(
+        id=m.id,
+        season_id=m.group.season_id,
+        group_id=m.group_id,
+        team_a_id=m.team_a_id,
+        team_b_id=m.team_b_id,
+        state=m.state.value,
+    )
+
+
+class MatchListQuery(UtcAwareBaseModel):
+    """
+    Filters and paging parameters for listing matches. All filters are optional and combined.
+    The cursor is opaque to the client -- just pass on the `next_cursor` of the previous page.
+    """
+    state: model.MatchState | None = None
+    group_id: int | None = None
+    season_id: int | None = None
+    team_id: int | None = None      # matches in which the team participates, either as team_a or team_b
+    map_id: int | None = None
+    after: datetime | None = None   # match_time >= after
+    before: datetime | None = None  # match_time < before
+
+    order_by: Literal['id', 'match_time'] = 'id'
+    cursor: str | None = None
+    limit: int = Field(default=50, ge=1, le=200)
+
+
+class MatchPage(UtcAwareBaseModel):
+    """A page of matches, and the cursor to fetch the next one (None if this is the last page)."""
+    matches: list[MatchResponse]
+    next_cursor: str | None
+
+
+def _encode_cursor(m: MatchResponse, order_by: str) -> str:
+    """the cursor identifies the last entry of a page, by the values of the sort keys"""
+    if order_by == 'id':
+        return encode_cursor(m.id)
+    return encode_cursor(m.match_time and m.match_time.timestamp(), m.id)
+
 
 @validate_call
-async def list_matches() -> list[MatchResponse]:
+@db.threaded
+def list_matches(query: MatchListQuery) -> MatchPage:
     """
-    Returns a list of matches.
-    TODO: restrict this, the list might get long!
+    Returns a page of matches, filtered as requested.
+    Paging is keyset-based: ordered by id, or by match_time (matches without a time last) and id.
     """
-    return list(MatchResponse(**model_to_dict(m, recurse=False))
-                 for m in model.Match.select().order_by(model.Match.id))
+    Match = model.Match
+    q = Match.select()
+
+    # --- filters ---
+    if query.state is not None:
+        q = q.where(Match.state == query.state)
+    if query.group_id is not None:
+        q = q.where(Match.group == query.group_id)
+    if query.season_id is not None:
+        groups = season.MatchGroup.select(season.MatchGroup.id).where(season.MatchGroup.season == query.season_id)
+        q = q.where(Match.group.in_(groups)) # type: ignore
+    if query.team_id is not None:
+        q = q.where((Match.team_a == query.team_id) | (Match.team_b == query.team_id))
+    if query.map_id is not None:
+        q = q.where(Match.game_map == query.map_id)
+    if query.after is not None:
+        q = q.where(Match.match_time >= query.after)
+    if query.before is not None:
+        q = q.where(Match.match_time < query.before)
+
+    # --- keyset paging ---
+    if query.order_by == 'id':
+        if query.cursor is not None:
+            last_id, = decode_cursor(query.cursor, 1)
+            q = q.where(Match.id > last_id)
+        q = q.order_by(Match.id)
+    else:
+        if query.cursor is not None:
+            last_time, last_id = decode_cursor(query.cursor, 2)
+            if last_time is None:
+                # already in the tail of matches without a date/time
+                q = q.where(Match.match_time.is_null() & (Match.id > last_id))
+            else:
+                q = q.where(
+                    (Match.match_time > last_time) |
+                    ((Match.match_time == last_time) & (Match.id > last_id)) |
+                    Match.match_time.is_null()
+                )
+        q = q.order_by(Match.match_time.asc(nulls='LAST'), Match.id)
+
+    # fetch one more than requested, to know if there is a next page
+    matches = _match_responses(q.limit(query.limit + 1))
+    has_more = len(matches) > query.limit
+    matches = matches[:query.limit]
+
+    return MatchPage.model_construct(
+        matches=matches,
+        next_cursor=_encode_cursor(matches[-1], query.order_by) if has_more else None,
+    )
 
 
 @validate_call
-async def list_matches_in_season(season_id: int) -> list[MatchResponse]:
+@db.threaded
+def list_matches_in_season(season_id: int) -> list[MatchResponse]:
     """returns all matches in a given season, shallow!"""
-    groups = list(season.MatchGroup.select(MatchGroup.id).where(season.MatchGroup.season_id == season_id)) # type: ignore
-    matches = list(
-        MatchResponse(**model_to_dict(m, recurse=False))
-        for m in model.Match.select().where(model.Match.group_id.in_(groups)) # type: ignore
-    )
-    return matches
+    groups = season.MatchGroup.select(MatchGroup.id).where(season.MatchGroup.season_id == season_id) # type: ignore
+    query = model.Match.select().where(model.Match.group_id.in_(groups)).order_by(model.Match.id) # type: ignore
+    return _match_responses(query)
 
 
 @validate_call
-async def list_matches_in_group(group_id: int) -> list[MatchResponse]:
+@db.threaded
+def list_matches_in_group(group_id: int) -> list[MatchResponse]:
     """returns all matches in a given match-group, shallow!"""
     group = MatchGroup.get_by_id(group_id)
-    return sorted([
-        MatchResponse(**model_to_dict(m, recurse=False))
-        for m in group.matches
-    ], key=lambda x: x.id)
+    return _match_responses(group.matches.order_by(model.Match.id))
 
 
 @validate_call
-async def list_matches_in_planning() -> list[MatchResponse]:
+@db.threaded
+def list_matches_in_planning() -> list[MatchResponse]:
     """
     Returns all matches that are currently in planning.
     These are all matches that have not all basic details set -- map, faction, time/date --
@@ -109,21 +223,23 @@ async def list_matches_in_planning() -> list[MatchResponse]:
     scheduling/map bans, or indirect through communication with admins).
     """
     query = model.Match.select().where(model.Match.state == model.MatchState.PLANNING)
-    return [MatchResponse(**model_to_dict(m, recurse=False)) for m in query]
+    return _match_responses(query)
 
 
 @validate_call
-async def list_matches_waiting_for_result() -> list[MatchResponse]:
+@db.threaded
+def list_matches_waiting_for_result() -> list[MatchResponse]:
     """
     Returns all matches that are fully planned and active but do not have a result.
     This includes matches which have not been fought yet.
     """
     query = model.Match.select().where(model.Match.state == model.MatchState.ACTIVE)
-    return [MatchResponse(**model_to_dict(m, recurse=False)) for m in query]
+    return _match_responses(query)
 
 
 @validate_call
-async def get_match(match_id: int) -> MatchResponse:
+@db.threaded
+def get_match(match_id: int) -> MatchResponse:
     """get a single match, shallow!"""
     m = model.Match.get_by_id(match_id)
     return MatchResponse(**model_to_dict(m, recurse=False))
@@ -132,7 +248,8 @@ async def get_match(match_id: int) -> MatchResponse:
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{data}')
-async def create_match(data: NewMatchData, author: auth.User) -> MatchResponse:
+@db.threaded
+def create_match(data: NewMatchData, author: auth.User) -> MatchResponse:
     """creates a new match entry in DRAFT state and returns """
 
     # check for teams
@@ -172,6 +289,7 @@ async def create_match(data: NewMatchData, author: auth.User) -> MatchResponse:
             map_selection_mode=data.map_selection_mode,
         )
         m.save()
+        db.emit(events.match_created, _match_event(m))
     return MatchResponse(**model_to_dict(m, recurse=False))
 
 
@@ -209,7 +327,8 @@ def __auto_update_match_state(m: model.Match):
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}: {data}')
-async def update_match(match_id: int, data: UpdateMatchData, author: auth.User) -> MatchResponse:
+@db.threaded
+def update_match(match_id: int, data: UpdateMatchData, author: auth.User) -> MatchResponse:
     """updates a match"""
 
     match data.match_time_state:
@@ -293,6 +412,7 @@ async def update_match(match_id: int, data: UpdateMatchData, author: auth.User)
         __auto_update_match_state(m)
 
         m.save()
+        db.emit(events.match_updated, _match_event(m))
 
     return MatchResponse(**model_to_dict(m, recurse=False))
 
@@ -300,7 +420,8 @@ async def update_match(match_id: int, data: UpdateMatchData, author: auth.User)
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}')
-async def set_active(match_id, author: auth.User) -> None:
+@db.threaded
+def set_active(match_id, author: auth.User) -> None:
     """activate the match, i.e. set it from 'draft' to planning or active"""
     with model.db_proxy.atomic() as txn:
         m = model.Match.get_by_id(match_id)
@@ -310,6 +431,7 @@ async def set_active(match_id, author: auth.User) -> None:
             case State.DRAFT:
                 m.state = State.PLANNING
                 __auto_update_match_state(m)  # for a potential transition to active
+                notification.enqueue(f'New match: {notification.match_title(m)}, on {notification.discord_time(m)}')
             case State.PLANNING | State.ACTIVE:
                 pass # nothing to do, already active
             case State.COMPLETED:
@@ -317,12 +439,14 @@ async def set_active(match_id, author: auth.User) -> None:
             case _:
                 raise ValueError("Invalid match state")
         m.save()
+        db.emit(events.match_updated, _match_event(m))
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}')
-async def set_draft(match_id, author: auth.User) -> None:
+@db.threaded
+def set_draft(match_id, author: auth.User) -> None:
     """deactivate a match, i.e. putting it back into draft mode"""
     with model.db_proxy.atomic() as txn:
         m = model.Match.get_by_id(match_id)
@@ -339,12 +463,14 @@ async def set_draft(match_id, author: auth.User) -> None:
                 raise ValueError("Invalid match state")
 
         m.save()
+        db.emit(events.match_updated, _match_event(m))
 
 
 @validate_call
 @auth.requires_team_manager()
 @audit.log_call('match: {match_id} / team: {team_id} / {match_time}')
-async def manager_suggest_match_time(match_id: int, team_id: int, match_time: datetime, author: auth.User) -> None:
+@db.threaded
+def manager_suggest_match_time(match_id: int, team_id: int, match_time: datetime, author: auth.User) -> None:
     """
     Suggestion of a team-manager for a date and time for a match.
     Also used for confirmation if the it matches a date/time suggested by the opponent before,
@@ -359,6 +485,8 @@ async def manager_suggest_match_time(match_id: int, team_id: int, match_time: da
         if team_id != m.team_a_id and team_id != m.team_b_id:
             raise ValueError("This team does not participate in this match.")
 
+        previous_schedule = (m.match_time, m.match_time_state)
+
         State = model.MatchSchedulingState
         match m.match_time_state:
             case State.FIXED | State.BOTH_CONFIRMED:
@@ -398,14 +526,34 @@ async def manager_suggest_match_time(match_id: int, team_id: int, match_time: da
         __auto_update_match_state(m)
         m.save()
 
+        if m.match_time_state == State.BOTH_CONFIRMED:
+            notification.enqueue(f'Confirmed: {notification.match_title(m)}, on {notification.discord_time(m)}')
+        elif (m.match_time, m.match_time_state) != previous_schedule:
+            team = m.team_a if team_id == m.team_a_id else m.team_b
+            notification.enqueue(
+                f'**{team.name}** suggests {notification.discord_time(m)} for {notification.match_title(m)}'
+            )
+        db.emit(events.match_updated, _match_event(m))
+
+
+def _select_for_update(match_id: int) -> pw.ModelSelect:
+    """
+    the match, locked until the end of the transaction: a concurrent change of its result waits for this one,
+    instead of retracting the same previous result from the standings and ratings as well.
+    (sqlite, e.g. during development, has no row locks -- but it serializes the writing transactions anyway)
+    """
+    query = model.Match.select().where(model.Match.id == match_id)
+    return query.for_update() if db.proxy.for_update else query
+
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}: winner {winner_id} result {result}')
-async def set_result(match_id: int, winner_id: int, result: model.MatchCapScore, author: auth.User) -> None:
+@db.threaded
+def set_result(match_id: int, winner_id: int, result: model.MatchCapScore, author: auth.User) -> None:
     """set a fixed match result which cannot be changed by team managers"""
     with model.db_proxy.atomic() as txn:
-        m = model.Match.get_by_id(match_id)
+        m = _select_for_update(match_id).get()
 
         # only allow to set a result if the match has all the details and is thus either
         # active or completed (when making a correction of a previously submitted result)
@@ -416,20 +564,35 @@ async def set_result(match_id: int, winner_id: int, result: model.MatchCapScore,
         if not winner_id in (m.team_a_id, m.team_b_id):
             raise ValueError("Selected team did not participate in this match.")
 
+        # a correction replaces the previous result in the standings
+        standings.retract_result(m)
+
         m.winner = winner_id
         m.winner_caps = result
         m.result_state = model.MatchResultState.FIXED
         m.state = model.MatchState.COMPLETED
         m.save()
+        standings.record_result(m)
+        ratings.record_result(m)
+        db.on_commit(functools.partial(stats.invalidate, m.group.season_id))
+
+        winner = m.team_a if winner_id == m.team_a_id else m.team_b
+        notification.enqueue(
+            f'Result: {notification.match_title(m)} -- **{winner.name}** wins {result.value}:{5 - result.value}'
+        )
+        db.emit(events.match_updated, _match_event(m))
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}')
-async def reset_result(match_id: int, author: auth.User) -> None:
+@db.threaded
+def reset_result(match_id: int, author: auth.User) -> None:
     """resets the result of a match"""
     with model.db_proxy.atomic() as txn:
-        m = model.Match.get_by_id(match_id)
+        m = _select_for_update(match_id).get()
+        had_result = m.winner_id is not None
+        standings.retract_result(m)
 
         m.winner = None
         m.winner_caps = None
@@ -446,11 +609,166 @@ async def reset_result(match_id: int, author: auth.User) -> None:
             case _:
                 raise ValueError("invalid state")
         m.save()
+        if had_result:
+            ratings.result_removed(m)
+            db.on_commit(functools.partial(stats.invalidate, m.group.season_id))
+        db.emit(events.match_updated, _match_event(m))
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call('{match_id}')
-async def delete_match(match_id: int, author: auth.User) -> None:
+@db.threaded
+def delete_match(match_id: int, author: auth.User) -> None:
     """deletes a match -- might affect other stuff, e.g. predictions"""
-    model.Match.delete_by_id(match_id)
+    with model.db_proxy.atomic() as txn:
+        m = _select_for_update(match_id).get_or_none()
+        if m is not None:
+            data = _match_event(m)
+            standings.retract_result(m)
+            m.delete_instance()
+            if m.winner_id is not None:
+                ratings.result_removed(m)
+                db.on_commit(functools.partial(stats.invalidate, data.season_id))
+            db.emit(events.match_deleted, data)
+
+
+"""
+fixtures: all matches of a group at once
+"""
+
+class NewFixturesData(UtcAwareBaseModel):
+    """
+    Creates the matches of a round-robin between all teams of a group: every team plays every other team once,
+    or twice (with home and away swapped) in a double round-robin.
+    """
+    double: bool = False
+    alternate_factions: bool = False  # assign the factions such that every team plays both about equally often
+
+
+def round_robin(team_ids: list[int], double: bool = False) -> list[list[tuple[int, int]]]:
+    """
+    The rounds of a round-robin by the circle method, as (team_a, team_b) pairings -- team_a being the home team.
+    The first team stays in place while the others rotate; with an odd number of teams, a placeholder stays in
+    place instead, and its opponent rests. Home and away alternate for the fixed team and follow the position for
+    the others, so that every team is home in half of its matches (+-1), and never more than twice in a row.
+    The second half of a double round-robin repeats the rounds of the first one with home and away swapped, starting
+    with its second round and ending with its first -- in the original order, the teams that end the first half
+    with two home (or away) matches would start the second half with a third one.
+    """
+    teams: list[int | None] = list(team_ids)
+    if len(teams) % 2:
+        teams.insert(0, None)  # the fixed "opponent" of the resting team
+    n = len(teams)
+
+    rounds: list[list[tuple[int, int]]] = []
+    for r in range(n - 1):
+        pairings = []
+        for i in range(n // 2):
+            home, away = teams[i], teams[n - 1 - i]
+            if (i == 0 and r % 2) or (i > 0 and i % 2 == 1):
+                home, away = away, home
+            if home is not None and away is not None:
+                pairings.append((home, away))
+        rounds.append(pairings)
+        # rotate all but the first team clockwise
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+
+    if double:
+        rounds += [[(b, a) for a, b in pairings] for pairings in rounds[1:] + rounds[:1]]
+    return rounds
+
+
+def _assign_factions(rounds: list[list[tuple[int, int]]]) -> list[model.Faction]:
+    """
+    The faction of team_a per pairing (in order): every team plays both factions equally often, +-1 if it has an
+    odd number of matches. The factions are chosen round by round to balance the matches so far, then teams left
+    with two matches too many on one side (possible with an odd number of teams) are corrected.
+    """
+    pairings = [p for r in rounds for p in r]
+    balance: dict[int, int] = {}  # allies - axis matches, per team
+    matches: dict[int, list[int]] = {}  # indices of the pairings, per team
+    a_allies: list[bool] = []
+    for r, round_pairings in enumerate(rounds):
+        for a, b in round_pairings:
+            diff = balance.get(a, 0) - balance.get(b, 0)
+            allies = diff < 0 or (diff == 0 and r % 2 == 0)
+            balance[a] = balance.get(a, 0) + (1 if allies else -1)
+            balance[b] = balance.get(b, 0) + (-1 if allies else 1)
+            for team in (a, b):
+                matches.setdefault(team, []).append(len(a_allies))
+            a_allies.append(allies)
+
+    def _side(i: int, team: int) -> int:
+        """+1 if the team plays allies in the pairing, -1 for axis"""
+        side = 1 if a_allies[i] else -1
+        return side if team == pairings[i][0] else -side
+
+    def _opponent(i: int, team: int) -> int:
+        a, b = pairings[i]
+        return b if team == a else a
+
+    while (start := next((t for t, bal in balance.items() if abs(bal) >= 2), None)) is not None:
+        sign = 1 if balance[start] > 0 else -1
+        # search a chain of matches from `start` to a team with a balance the other way round, in which each team
+        # plays the faction `start` has too many of against the next one. Swapping the factions of these matches
+        # moves two matches from `start` to the end of the chain -- the teams in between keep their balance.
+        # (such a chain always exists: the teams reachable this way cannot all have too many matches on that side)
+        reached_by: dict[int, int | None] = {start: None}  # team -> pairing it was reached by
+        stack = [start]
+        while balance[end := stack.pop()] * sign >= 0:
+            for i in matches[end]:
+                other = _opponent(i, end)
+                if _side(i, end) == sign and other not in reached_by:
+                    reached_by[other] = i
+                    stack.append(other)
+
+        balance[start] -= 2 * sign
+        balance[end] += 2 * sign
+        team = end
+        while (i := reached_by[team]) is not None:
+            a_allies[i] = not a_allies[i]
+            team = _opponent(i, team)
+
+    return [model.Faction.ALLIES if allies else model.Faction.AXIS for allies in a_allies]
+
+
+@validate_call
+@auth.requires_admin()
+@audit.log_call('group {group_id}: {data}')
+@db.threaded
+def create_fixtures(group_id: int, data: NewFixturesData, author: auth.User) -> list[MatchResponse]:
+    """
+    Create the round-robin matches between the teams of a group, in DRAFT state and ordered by round -- with a
+    single bulk insert, and a single fixtures.created event. The group must not have any matches yet.
+    """
+    with db.proxy.atomic():
+        group = MatchGroup.get_by_id(group_id)
+        if model.Match.select().where(model.Match.group == group_id).exists():
+            raise ValueError('The group already has matches.')
+
+        team_ids = [tid for tid, in season.TeamInGroup.select(season.TeamInGroup.team)
+                                                      .where(season.TeamInGroup.group == group_id)
+                                                      .order_by(season.TeamInGroup.id)
+                                                      .tuples()]
+        if len(team_ids) < 2:
+            raise ValueError('A round-robin requires at least two teams in the group.')
+
+        rounds = round_robin(team_ids, data.double)
+        pairings = [p for r in rounds for p in r]
+        factions = _assign_factions(rounds) if data.alternate_factions else [None] * len(pairings)
+
+        rows = [
+            {'group': group_id, 'team_a': a, 'team_b': b, 'team_a_faction': faction}
+            for (a, b), faction in zip(pairings, factions)
+        ]
+        for batch in pw.chunked(rows, BULK_INSERT_CHUNK_SIZE):
+            model.Match.insert_many(batch).execute()
+
+        query = model.Match.select().where(model.Match.group == group_id).order_by(model.Match.id)
+        matches = _match_responses(query)
+
+        db.emit(events.fixtures_created, events.FixturesData(
+            group_id=group_id, season_id=group.season_id, team_ids=team_ids, matches=len(matches),
+        ))
+    return matches
@@ -0,0 +1,70 @@
+"""discord notifications about match changes, through the outbox that is drained by the bot"""
+
+import time
+
+import peewee as pw
+
+from match_manager import bot, config, events
+from .db.match import Match
+from .db.notification import Notification
+from . import db
+
+
+def enqueue(content: str) -> None:
+    """
+    Queue a notification for the announcement channel. Must be called within the transaction of the change it
+    announces, so both are stored -- or discarded -- together.
+    """
+    channel_id = config.discord.announcement_channel_id
+    if channel_id is None:
+        return
+
+    now = time.time()
+    Notification.insert(channel_id=str(channel_id), content=content, created=now, next_attempt=now).execute()
+    db.emit(events.notification_queued, events.NotificationData(channel_id=str(channel_id)))
+
+
+def match_title(m: Match) -> str:
+    """e.g. '**Team A** vs **Team B**' (loads the teams)"""
+    return f'**{m.team_a.name}** vs **{m.team_b.name}**'
+
+
+def discord_time(m: Match) -> str:
+    """the match time, displayed by discord in the local time of the reader"""
+    return f'<t:{int(m.match_time.timestamp())}:F>' if m.match_time else 'a date to be announced'
+
+
+class DatabaseOutbox(bot.OutboxStore):
+    """access to the outbox table, for the bot"""
+
+    @db.threaded
+    def fetch_due(self, limit: int) -> list[bot.OutboxMessage]:
+        now = time.time()
+        # notifications queue up behind an earlier one of their channel that waits for a retry
+        earlier = Notification.alias()
+        waiting = earlier.select().where(
+            (earlier.channel_id == Notification.channel_id) &
+            (earlier.id < Notification.id) &
+            (earlier.next_attempt > now)
+        )
+        query = (Notification
+                 .select(Notification.id, Notification.channel_id, Notification.content, Notification.attempts)
+                 .where((Notification.next_attempt <= now) & ~pw.fn.EXISTS(waiting))
+                 .order_by(Notification.id)
+                 .limit(limit))
+        return [bot.OutboxMessage(*row) for row in query.tuples()]
+
+    @db.threaded
+    def mark_sent(self, ids: list[int]) -> None:
+        Notification.update(sent=time.time(), next_attempt=None).where(Notification.id.in_(ids)).execute()
+
+    @db.threaded
+    def mark_failed(self, ids: list[int], error: str, retry_in: float | None, count_attempt: bool = True) -> None:
+        Notification.update(
+            attempts=Notification.attempts + int(count_attempt),
+            last_error=error,
+            next_attempt=None if retry_in is None else time.time() + retry_in,
+        ).where(Notification.id.in_(ids)).execute()
+
+
+outbox = DatabaseOutbox()
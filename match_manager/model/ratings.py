@@ -0,0 +1,285 @@
+"""
+Elo ratings of the teams, per season, computed from the match results.
+
+The results of a season are rated in the order of their match times. A new result that comes after all rated
+matches of its season is applied incrementally, in the transaction that records it. Everything else -- corrections
+of earlier results, resets, late results of older matches -- recomputes the ratings of the season.
+
+Recomputes are batched with numpy: the matches are split into rounds in which no team plays twice, and all
+matches of a round are rated at once. The ratings stay exactly those of a match-by-match computation.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import peewee as pw
+from pydantic import BaseModel, validate_call
+
+from .db.match import Match, MatchCapScore
+from .db.rating import TeamRating, RatingHistory
+from .db.season import Season, MatchGroup
+from match_manager import events
+from . import auth, audit, db
+
+ELO_INITIAL = 1500.0
+ELO_K = 32.0
+ELO_SCALE = 400.0  # a difference of this many points means 10:1 odds
+
+INSERT_CHUNK_SIZE = 1000
+
+
+"""
+pydantic models for the responses
+"""
+
+class TeamRatingResponse(BaseModel):
+    """the current rating of a team in a season"""
+    team_id: int
+    rating: float
+    matches: int
+
+
+class RatingPoint(BaseModel):
+    """the rating of a team after one of its matches"""
+    match_id: int
+    match_time: datetime
+    rating: float
+    delta: float
+
+
+"""
+the computation
+"""
+
+def _k_factor(winner_caps):
+    """clearer wins move the ratings more: x1 for 3:2, x1.25 for 4:1 and x1.5 for 5:0"""
+    return ELO_K * (1.0 + (winner_caps - 3) / 4)
+
+
+def _elo_delta(rating_a, rating_b, score_a, k):
+    """the rating change of team a -- team b changes by the negative. Works on scalars and arrays alike."""
+    expected_a = 1.0 / (1.0 + np.power(10.0, (rating_b - rating_a) / ELO_SCALE))
+    return k * (score_a - expected_a)
+
+
+def _rounds(slot_a: np.ndarray, slot_b: np.ndarray, num_slots: int) -> np.ndarray:
+    """
+    Assign the matches (in rating order) to rounds, such that every team plays at most once per round, and
+    after all of its earlier matches. Rounds can then be rated as a whole.
+    """
+    next_round = [0] * num_slots
+    rounds = [0] * len(slot_a)
+    for i, (a, b) in enumerate(zip(slot_a.tolist(), slot_b.tolist())):
+        r = max(next_round[a], next_round[b])
+        rounds[i] = r
+        next_round[a] = next_round[b] = r + 1
+    return np.array(rounds, dtype=np.int64)
+
+
+def compute_ratings(slot_a: np.ndarray, slot_b: np.ndarray, score_a: np.ndarray, k: np.ndarray,
+                    num_slots: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Rate the matches (in rating order) between the given slots, e.g. teams in a season -- all starting at the
+    initial rating. Returns the final ratings by slot, and per match the ratings of both teams afterwards and
+    the change of team a.
+    """
+    ratings = np.full(num_slots, ELO_INITIAL)
+    after_a = np.empty(len(slot_a))
+    after_b = np.empty(len(slot_a))
+    delta = np.empty(len(slot_a))
+    if len(slot_a) == 0:
+        return ratings, after_a, after_b, delta
+
+    rounds = _rounds(slot_a, slot_b, num_slots)
+    order = np.argsort(rounds, kind='stable')
+    for idx in np.split(order, np.flatnonzero(np.diff(rounds[order])) + 1):
+        a, b = slot_a[idx], slot_b[idx]
+        d = _elo_delta(ratings[a], ratings[b], score_a[idx], k[idx])
+        # no slot appears twice in a round, so the updates do not collide
+        ratings[a] += d
+        ratings[b] -= d
+        after_a[idx], after_b[idx], delta[idx] = ratings[a], ratings[b], d
+
+    return ratings, after_a, after_b, delta
+
+
+"""
+maintenance of the tables -- blocking, to be called within the transactions of the match operations
+"""
+
+def _results_query(season_ids: list[int] | None):
+    """the rated results, in rating order"""
+    query = (Match
+             .select(Match.id, MatchGroup.season, Match.team_a, Match.team_b, Match.winner, Match.winner_caps,
+                     Match.match_time)
+             .join(MatchGroup)
+             .where(Match.winner.is_null(False) & Match.match_time.is_null(False))  # type: ignore
+             .order_by(Match.match_time, Match.id))
+    if season_ids is not None:
+        query = query.where(MatchGroup.season.in_(season_ids))  # type: ignore
+    return query
+
+
+def _lock_seasons(season_ids: list[int] | None) -> None:
+    """
+    Lock the seasons (or all) until the end of the transaction: their ratings are read and written by one
+    transaction at a time, so a concurrent result waits and is then rated on top of this one -- instead of both
+    starting from the same ratings. (sqlite has no row locks, but it serializes the writing transactions anyway)
+    """
+    if not db.proxy.for_update:
+        return
+    query = Season.select(Season.id).order_by(Season.id).for_update()
+    if season_ids is not None:
+        query = query.where(Season.id.in_(season_ids))  # type: ignore
+    query.tuples().execute()
+
+
+def _recompute(season_ids: list[int] | None = None) -> int:
+    """recompute the ratings of the given seasons (or of all), returns the number of rated matches"""
+    with db.proxy.atomic():
+        _lock_seasons(season_ids)
+        # raw rows, to skip the conversion into python objects -- the values go straight into arrays
+        rows = db.proxy.execute(_results_query(season_ids)).fetchall()
+        caps_by_name = {c.name: c.value for c in MatchCapScore}
+
+        if rows:
+            match_id, season, team_a, team_b, winner, caps, match_time = (np.array(col) for col in zip(*rows))
+        else:
+            match_id = season = team_a = team_b = winner = match_time = np.empty(0, dtype=np.int64)
+            caps = np.empty(0, dtype=object)
+
+        # a slot per team and season
+        keys, slots = np.unique(np.concatenate([season, season]) * (1 << 32) + np.concatenate([team_a, team_b]),
+                                return_inverse=True)
+        slot_a, slot_b = slots[:len(rows)], slots[len(rows):]
+        slot_season, slot_team = np.divmod(keys, 1 << 32)
+
+        score_a = (winner == team_a).astype(np.float64)
+        k = _k_factor(np.array([caps_by_name[c] for c in caps], dtype=np.float64))
+        ratings, after_a, after_b, delta = compute_ratings(slot_a, slot_b, score_a, k, len(keys))
+        played = np.bincount(slots, minlength=len(keys))
+
+        for model in (TeamRating, RatingHistory):
+            delete = model.delete()
+            if season_ids is not None:
+                delete = delete.where(model.season.in_(season_ids))  # type: ignore
+            delete.execute()
+
+        rating_rows = zip(slot_season.tolist(), slot_team.tolist(), ratings.tolist(), played.tolist())
+        for batch in pw.chunked(rating_rows, INSERT_CHUNK_SIZE):
+            TeamRating.insert_many(
+                batch, fields=[TeamRating.season, TeamRating.team, TeamRating.rating, TeamRating.matches]
+            ).execute()
+
+        def _history_rows():
+            # one row per team and match -- match_time is passed on as the raw value it was read as
+            for s, ta, tb, m, time, ra, rb, d in zip(season.tolist(), team_a.tolist(), team_b.tolist(),
+                                                     match_id.tolist(), match_time.tolist(), after_a.tolist(),
+                                                     after_b.tolist(), delta.tolist()):
+                yield s, ta, m, time, ra, d
+                yield s, tb, m, time, rb, -d
+
+        for batch in pw.chunked(_history_rows(), INSERT_CHUNK_SIZE):
+            RatingHistory.insert_many(
+                batch, fields=[RatingHistory.season, RatingHistory.team, RatingHistory.match, RatingHistory.match_time,
+                               RatingHistory.rating, RatingHistory.delta]
+            ).execute()
+
+        return len(rows)
+
+
+def _season_of(m: Match) -> int:
+    return MatchGroup.select(MatchGroup.season).where(MatchGroup.id == m.group_id).scalar()
+
+
+def record_result(m: Match) -> None:
+    """rate the (new) result of the match -- incrementally if possible, otherwise by recomputing its season"""
+    if m.winner_id is None or m.winner_caps is None or m.match_time is None:
+        return
+
+    season_id = _season_of(m)
+    _lock_seasons([season_id])
+    last = (RatingHistory
+            .select(RatingHistory.match_time, RatingHistory.match)
+            .where(RatingHistory.season == season_id)
+            .order_by(RatingHistory.match_time.desc(), RatingHistory.match.desc())
+            .limit(1)
+            .tuples()
+            .first())
+
+    corrected = RatingHistory.select().where(RatingHistory.match == m.id).exists()
+    if corrected or (last is not None and (m.match_time, m.id) < last):
+        _recompute([season_id])
+        return
+
+    current = {
+        r.team_id: r for r in
+        TeamRating.select().where((TeamRating.season == season_id) & TeamRating.team.in_([m.team_a_id, m.team_b_id]))
+    }
+    def _rating(team_id: int) -> np.float64:
+        return np.float64(current[team_id].rating if team_id in current else ELO_INITIAL)
+
+    delta = float(_elo_delta(_rating(m.team_a_id), _rating(m.team_b_id), float(m.winner_id == m.team_a_id),
+                             _k_factor(np.float64(m.winner_caps.value))))
+
+    for team_id, d in ((m.team_a_id, delta), (m.team_b_id, -delta)):
+        rating = float(_rating(team_id) + d)
+        TeamRating.insert(season=season_id, team=team_id, rating=rating, matches=1).on_conflict(
+            conflict_target=[TeamRating.season, TeamRating.team],
+            update={TeamRating.rating: rating, TeamRating.matches: TeamRating.matches + 1},
+        ).execute()
+        RatingHistory.create(season=season_id, team=team_id, match=m.id, match_time=m.match_time, rating=rating,
+                             delta=d)
+
+
+def result_removed(m: Match) -> None:
+    """after the result of the match was reset, or the match deleted: recompute its season"""
+    _recompute([_season_of(m)])
+
+
+def initialize() -> None:
+    """
+    Compute the ratings if there are none while there are results, e.g. right after the tables were created by
+    the schema evolution. Blocking, called on startup.
+    """
+    if not TeamRating.select().exists() and Match.select().where(Match.winner.is_null(False)).exists():  # type: ignore
+        _recompute()
+
+
+"""
+model operations
+"""
+
+@validate_call
+@db.threaded
+def get_season_ratings(season_id: int) -> list[TeamRatingResponse]:
+    """the current ratings in a season, best first"""
+    query = (TeamRating
+             .select(TeamRating.team, TeamRating.rating, TeamRating.matches)
+             .where(TeamRating.season == season_id)
+             .order_by(TeamRating.rating.desc(), TeamRating.team)
+             .tuples())
+    return [TeamRatingResponse.model_construct(team_id=t, rating=r, matches=n) for t, r, n in query]
+
+
+@validate_call
+@db.threaded
+def get_rating_history(season_id: int, team_id: int) -> list[RatingPoint]:
+    """the course of the rating of a team in a season, match by match"""
+    query = (RatingHistory
+             .select(RatingHistory.match, RatingHistory.match_time, RatingHistory.rating, RatingHistory.delta)
+             .where((RatingHistory.season == season_id) & (RatingHistory.team == team_id))
+             .order_by(RatingHistory.match_time, RatingHistory.match)
+             .tuples())
+    return [RatingPoint.model_construct(match_id=m, match_time=t, rating=r, delta=d) for m, t, r, d in query]
+
+
+@validate_call
+@auth.requires_admin()
+@audit.log_call()
+@db.threaded
+def recompute_ratings(author: auth.User) -> int:
+    """recompute the ratings of all seasons from the match results -- returns the number of rated matches"""
+    matches = _recompute()
+    db.emit(events.ratings_recomputed, events.RatingsData(matches=matches))
+    return matches
@@ -8,7 +8,9 @@ from typing import Optional
 from .db.season import Season, MatchGroup, TeamInGroup
 from .db.team import Team
 from .team import TeamResponse
-from . import auth, db, audit
+from match_manager import events
+from match_manager.util import ReferenceCache
+from . import auth, db, audit, standings
 
 """
 pydantic models for validation
@@ -60,11 +62,9 @@ class SeasonResponse(BaseModel):
 model operations
 """
 
-@validate_call
-async def list_seasons() -> list[SeasonOverview]:
-    """list all seasons"""
-
-    season_query = Season.select();
+@db.threaded
+def _load_seasons() -> list[SeasonOverview]:
+    season_query = Season.select().order_by(Season.id)
     groups_query = MatchGroup.select().order_by(MatchGroup.id)  # type: ignore
     seasons_with_groups = pw.prefetch(season_query, groups_query)
 
@@ -81,73 +81,92 @@ async def list_seasons() -> list[SeasonOverview]:
     ]
 
 
+# the seasons and their groups are set up once per season -- keep the overview in memory, invalidated by the
+# model operations below and the season and group events (also those of other processes)
+_seasons = ReferenceCache(_load_seasons, key=lambda s: s.id)
+
+@events.season.add_handler
+async def _on_season_changed(_data: events.SeasonData) -> None:
+    _seasons.invalidate()
+
+@events.match_group.add_handler
+async def _on_group_changed(_data: events.MatchGroupData) -> None:
+    _seasons.invalidate()
+
+
+def season_cache_stats() -> dict[str, int]:
+    """size and counters of the season cache"""
+    return _seasons.stats()
+
+
 @validate_call
-async def get_season(season_id: int) -> SeasonResponse:
-    """get the details of a selected season"""
+async def list_seasons() -> list[SeasonOverview]:
+    """list all seasons"""
+    return await _seasons.all()
 
-    season = Season.get_by_id(season_id)
-    groups_q = MatchGroup.select().where(MatchGroup.season_id == season_id) # type: ignore
-    teamsingroup_q = TeamInGroup.select()
-    teams_q = Team.select()
-
-    groups_with_teams = pw.prefetch(groups_q, teamsingroup_q, teams_q)
-
-    groups = [
-        MatchGroupResponse(
-            id=g.id,
-            name=g.name,
-            teams=[
-                TeamResponse(**model_to_dict(t_in_g.team))
-                for t_in_g in g.teams
-            ]
-        )
-        for g in groups_with_teams
-    ]
 
-    return SeasonResponse(id=season.id, name=season.name, match_groups=groups)
+def _with_teams(groups: list[MatchGroup]) -> list[MatchGroupResponse]:
+    """
+    the responses for the given groups, including their teams -- which are loaded with a single query, for
+    exactly these groups
+    """
+    teams: dict[int, list[TeamResponse]] = {g.id: [] for g in groups}
+    if groups:
+        query = (TeamInGroup
+                 .select(TeamInGroup.group.alias('group_id'), Team)  # type: ignore
+                 .join(Team)
+                 .where(TeamInGroup.group.in_(list(teams)))  # type: ignore
+                 .order_by(TeamInGroup.id)
+                 .dicts())
+        for row in query:
+            teams[row.pop('group_id')].append(TeamResponse.from_row(row))
+
+    return [MatchGroupResponse(id=g.id, name=g.name, teams=teams[g.id]) for g in groups]
+
+
+@validate_call
+@db.threaded
+def get_season(season_id: int) -> SeasonResponse:
+    """get the details of a selected season"""
+    season = Season.get_by_id(season_id)
+    groups = list(MatchGroup.select().where(MatchGroup.season == season_id).order_by(MatchGroup.id))  # type: ignore
+    return SeasonResponse(id=season.id, name=season.name, match_groups=_with_teams(groups))
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call(description='{season_data}')
-async def create_season(season_data: NewSeasonData, author: auth.User) -> SeasonResponse:
+@db.threaded
+def create_season(season_data: NewSeasonData, author: auth.User) -> SeasonResponse:
     """create a new season"""
     with db.proxy.atomic() as txn:
         s = Season(name=season_data.name)
         s.save()
+        db.on_commit(_seasons.invalidate)
+        db.emit(events.season_created, events.SeasonData(id=s.id, name=s.name))
 
     return SeasonResponse(**model_to_dict(s, backrefs=True))
 
 
 @validate_call
-async def get_match_group(group_id: int) -> MatchGroupResponse:
+@db.threaded
+def get_match_group(group_id: int) -> MatchGroupResponse:
     """get the details of a selected match group"""
-    group_with_teams = pw.prefetch(
-        MatchGroup.select().where(MatchGroup.id == group_id), # type: ignore
-        TeamInGroup.select(),
-        Team.select()
-    )
-    assert len(group_with_teams) == 1
-    group = group_with_teams[0]
-    return MatchGroupResponse(
-        id=group.id,
-        name=group.name,
-        teams=[
-            TeamResponse(**model_to_dict(t_in_g.team))
-            for t_in_g in group.teams
-        ]
-    )
+    return _with_teams([MatchGroup.get_by_id(group_id)])[0]
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call(description='{group_data}')
-async def create_match_group(group_data: NewMatchGroupData, author: auth.User) -> MatchGroupResponse:
+@db.threaded
+def create_match_group(group_data: NewMatchGroupData, author: auth.User) -> MatchGroupResponse:
     """create a new match group"""
     with db.proxy.atomic() as txn:
         season = Season.get_by_id(group_data.season_id)
         group = MatchGroup(name=group_data.name, season=season)
         group.save()
+        db.on_commit(_seasons.invalidate)
+        db.emit(events.match_group_created, events.MatchGroupData(id=group.id, season_id=season.id, name=group.name))
 
     return MatchGroupResponse(**model_to_dict(group), teams=[])
 
@@ -155,7 +174,8 @@ async def create_match_group(group_data: NewMatchGroupData, author: auth.User) -
 @validate_call
 @auth.requires_admin()
 @audit.log_call(description='{group_id}: {group_data}')
-async def update_match_group(group_id: int, group_data: UpdateMatchGroupData, author: auth.User) -> MatchGroupResponse:
+@db.threaded
+def update_match_group(group_id: int, group_data: UpdateMatchGroupData, author: auth.User) -> MatchGroupResponse:
     """update an existing match group"""
     with db.proxy.atomic() as txn:
         group = MatchGroup.get_by_id(group_id)
@@ -166,16 +186,27 @@ async def update_match_group(group_id: int, group_data: UpdateMatchGroupData, au
         if group_data.teams is not None:
             # simplify: remove all, then add all
             TeamInGroup.delete().where(TeamInGroup.group==group).execute()
-            TeamInGroup.bulk_create([TeamInGroup(group=group, team_id=tid) for tid in group_data.teams])
+            # (drop duplicates, a team can only be in the group once)
+            TeamInGroup.bulk_create([TeamInGroup(group=group, team_id=tid) for tid in dict.fromkeys(group_data.teams)])
+            standings.sync_members(group.id, group_data.teams)
 
         group.save()
+        db.on_commit(_seasons.invalidate)
+        db.emit(events.match_group_updated, events.MatchGroupData(id=group.id, season_id=group.season_id, name=group.name))
 
-    return MatchGroupResponse(id=group.id, name=group.name, teams=[TeamResponse(**model_to_dict(t.team)) for t in group.teams])
+        return _with_teams([group])[0]
 
 
 @validate_call
 @auth.requires_admin()
 @audit.log_call(description='{group_id}')
-async def delete_match_group(group_id: int, author: auth.User) -> None:
+@db.threaded
+def delete_match_group(group_id: int, author: auth.User) -> None:
     """delete an existing match group"""
-    MatchGroup.delete_by_id(group_id)
+    with db.proxy.atomic() as txn:
+        group = MatchGroup.get_or_none(MatchGroup.id == group_id)
+        if group is not None:
+            group.delete_instance()
+            db.on_commit(_seasons.invalidate)
+            db.emit(events.match_group_deleted,
+                    events.MatchGroupData(id=group.id, season_id=group.season_id, name=group.name))
@@ -0,0 +1,186 @@
+"""
+Standings of the teams in their match groups.
+
+The standings are materialized in their own table: the match operations apply the changes of a result in the
+same transaction that records (or resets) it, so reading the standings of a group is a single lookup instead of
+a scan of all its matches. `rebuild_standings` recomputes the table from the matches, e.g. to check it.
+"""
+
+from pydantic import BaseModel, validate_call
+
+from .db.match import Match
+from .db.season import TeamInGroup
+from .db.standing import Standing
+from match_manager import events
+from . import auth, audit, db
+
+POINTS_FOR_WIN = 3
+POINTS_FOR_LOSS = 0
+TOTAL_CAPS = 5  # the caps of winner and loser add up to this, see MatchCapScore
+
+# the values accumulated per team, and the order of the ranking: the tiebreakers follow the points
+COUNTERS = ('played', 'wins', 'losses', 'caps_for', 'caps_against', 'points')
+
+
+"""
+pydantic models for the responses
+"""
+
+class StandingEntry(BaseModel):
+    """the position and results of a team in a group -- teams that are tied on all criteria share their rank"""
+    rank: int
+    team_id: int
+    played: int
+    wins: int
+    losses: int
+    caps_for: int
+    caps_against: int
+    points: int
+
+
+class GroupStandings(BaseModel):
+    """the standings of a match group, in ranked order"""
+    group_id: int
+    standings: list[StandingEntry]
+
+
+"""
+maintenance of the table -- blocking, to be called within the transactions of the match operations
+"""
+
+def _result_deltas(m: Match) -> list[tuple[int, dict[str, int]]]:
+    """the changes a match result makes to the standings of both teams, by team id -- none if there is no result"""
+    if m.winner_id is None or m.winner_caps is None:
+        return []
+
+    caps = m.winner_caps.value
+    loser_id = m.team_b_id if m.winner_id == m.team_a_id else m.team_a_id
+    return [
+        (m.winner_id, dict(played=1, wins=1, losses=0, caps_for=caps, caps_against=TOTAL_CAPS - caps,
+                           points=POINTS_FOR_WIN)),
+        (loser_id, dict(played=1, wins=0, losses=1, caps_for=TOTAL_CAPS - caps, caps_against=caps,
+                        points=POINTS_FOR_LOSS)),
+    ]
+
+
+def _apply(m: Match, sign: int) -> None:
+    for team_id, deltas in _result_deltas(m):
+        Standing.insert(group=m.group_id, team=team_id).on_conflict_ignore().execute()
+        (Standing
+         .update({getattr(Standing, name): getattr(Standing, name) + sign * value for name, value in deltas.items()})
+         .where((Standing.group == m.group_id) & (Standing.team == team_id))
+         .execute())
+
+
+def record_result(m: Match) -> None:
+    """add the (new) result of the match to the standings"""
+    _apply(m, +1)
+
+
+def retract_result(m: Match) -> None:
+    """remove the (current) result of the match from the standings, before it is changed, reset or deleted"""
+    _apply(m, -1)
+
+
+def sync_members(group_id: int, team_ids: list[int]) -> None:
+    """
+    after the teams of a group changed: list the new teams (without results so far), and drop the teams that left
+    the group -- unless they already played in it
+    """
+    if team_ids:
+        Standing.insert_many(
+            [{'group': group_id, 'team': tid} for tid in team_ids]
+        ).on_conflict_ignore().execute()
+
+    Standing.delete().where(
+        (Standing.group == group_id) &
+        Standing.team.not_in(team_ids) &  # type: ignore
+        (Standing.played == 0)
+    ).execute()
+
+
+def _rebuild() -> int:
+    """recompute the whole table from the memberships and match results, returns the number of corrected rows"""
+    with db.proxy.atomic():
+        expected: dict[tuple[int, int], dict[str, int]] = {}
+        for group_id, team_id in TeamInGroup.select(TeamInGroup.group, TeamInGroup.team).tuples():
+            expected[(group_id, team_id)] = dict.fromkeys(COUNTERS, 0)
+
+        results = Match.select(Match.group, Match.team_a, Match.team_b, Match.winner, Match.winner_caps).where(
+            Match.winner.is_null(False)  # type: ignore
+        )
+        for m in results:
+            for team_id, deltas in _result_deltas(m):
+                row = expected.setdefault((m.group_id, team_id), dict.fromkeys(COUNTERS, 0))
+                for name, value in deltas.items():
+                    row[name] += value
+
+        corrected = 0
+        for s in Standing.select():
+            row = expected.pop((s.group_id, s.team_id), None)
+            if row is None:
+                s.delete_instance()
+                corrected += 1
+            elif any(getattr(s, name) != value for name, value in row.items()):
+                Standing.update(row).where(Standing.id == s.id).execute()
+                corrected += 1
+
+        # rows that are missing entirely
+        if expected:
+            Standing.insert_many(
+                [{'group': group_id, 'team': team_id, **row} for (group_id, team_id), row in expected.items()]
+            ).execute()
+            corrected += len(expected)
+
+    return corrected
+
+
+def initialize() -> None:
+    """
+    Fill the table if it is empty while there are groups, e.g. right after it was created by the schema evolution.
+    Blocking, called on startup.
+    """
+    if not Standing.select().exists() and TeamInGroup.select().exists():
+        _rebuild()
+
+
+"""
+model operations
+"""
+
+@validate_call
+@db.threaded
+def get_standings(group_id: int) -> GroupStandings:
+    """the ranked standings of a match group"""
+    query = (Standing
+             .select()
+             .where(Standing.group == group_id)
+             .order_by(Standing.points.desc(),
+                       Standing.wins.desc(),
+                       (Standing.caps_for - Standing.caps_against).desc(),
+                       Standing.caps_for.desc(),
+                       Standing.team)
+             .dicts())
+
+    entries: list[StandingEntry] = []
+    previous: tuple | None = None
+    for position, row in enumerate(query, start=1):
+        key = (row['points'], row['wins'], row['caps_for'] - row['caps_against'], row['caps_for'])
+        rank = entries[-1].rank if key == previous else position
+        previous = key
+        entries.append(StandingEntry.model_construct(rank=rank, team_id=row['team'],
+                                                     **{name: row[name] for name in COUNTERS}))
+
+    return GroupStandings.model_construct(group_id=group_id, standings=entries)
+
+
+@validate_call
+@auth.requires_admin()
+@audit.log_call()
+@db.threaded
+def rebuild_standings(author: auth.User) -> int:
+    """recompute all standings from the match results -- returns the number of rows that had to be corrected"""
+    corrected = _rebuild()
+    if corrected:
+        db.emit(events.standings_rebuilt, events.StandingsData(corrected=corrected))
+    return corrected
@@ -0,0 +1,202 @@
+"""
+Statistics of the maps, factions and teams -- e.g. the win rate of the allies on a map in a season.
+
+All numbers are aggregated by the database (GROUP BY), the matches are never loaded. The results are cached per
+season (and for all seasons), and dropped when a result in the season changes.
+"""
+
+import peewee as pw
+from pydantic import BaseModel, validate_call
+
+from match_manager import events
+from match_manager.util import TTLCache
+from .db.match import Match, Faction, MatchCapScore
+from .db.season import MatchGroup
+from . import db
+
+TOTAL_CAPS = 5  # the caps of winner and loser add up to this, see MatchCapScore
+STATS_CACHE_TTL = 3600  # seconds -- a safety net, the entries are invalidated on changes
+
+
+"""
+pydantic models for the responses
+"""
+
+class MapStats(BaseModel):
+    """results on a map -- only completed matches with a known faction count"""
+    map_id: int
+    matches: int
+    allies_wins: int
+    axis_wins: int
+    allies_caps: int
+    axis_caps: int
+
+
+class FactionStats(BaseModel):
+    """results of a faction, over all maps"""
+    faction: Faction
+    matches: int
+    wins: int
+    caps: int
+
+
+class TeamStats(BaseModel):
+    """results of a team, by the faction it played"""
+    team_id: int
+    matches: int
+    wins: int
+    allies_matches: int
+    allies_wins: int
+    axis_matches: int
+    axis_wins: int
+    caps_for: int
+    caps_against: int
+
+
+"""
+the aggregations
+"""
+
+def _count(condition) -> pw.Node:
+    return pw.fn.SUM(pw.Case(None, [(condition, 1)], 0))
+
+
+# the caps of the winner, from the stored score
+_WINNER_CAPS = pw.Case(None, [(Match.winner_caps == score, score.value) for score in MatchCapScore])
+
+_ALLIES_WON = (((Match.winner == Match.team_a) & (Match.team_a_faction == Faction.ALLIES)) |
+               ((Match.winner == Match.team_b) & (Match.team_a_faction == Faction.AXIS)))
+
+
+def _results(season_id: int | None, *columns) -> pw.ModelSelect:
+    """select from the matches that count: with a result and a known faction, optionally in a season"""
+    query = Match.select(*columns).where(Match.winner.is_null(False) & Match.team_a_faction.is_null(False))  # type: ignore
+    if season_id is not None:
+        query = query.join(MatchGroup).where(MatchGroup.season == season_id)
+    return query
+
+
+def _aggregate_maps(season_id: int | None) -> list[MapStats]:
+    allies_caps = pw.Case(None, [(_ALLIES_WON, _WINNER_CAPS)], TOTAL_CAPS - _WINNER_CAPS)
+    query = (_results(season_id,
+                      Match.game_map,
+                      pw.fn.COUNT(Match.id),
+                      _count(_ALLIES_WON),
+                      pw.fn.SUM(allies_caps))
+             .where(Match.game_map.is_null(False))  # type: ignore
+             .group_by(Match.game_map)
+             .order_by(Match.game_map)
+             .tuples())
+    return [
+        MapStats(map_id=map_id, matches=n, allies_wins=allies_wins, axis_wins=n - allies_wins,
+                 allies_caps=caps, axis_caps=n * TOTAL_CAPS - caps)
+        for map_id, n, allies_wins, caps in query
+    ]
+
+
+def _aggregate_teams(season_id: int | None) -> list[TeamStats]:
+    def _side(team: pw.Field, allies_if: Faction) -> pw.ModelSelect:
+        """one row per match for one of the teams -- it played allies if team_a played `allies_if`"""
+        won = Match.winner == team
+        caps = pw.Case(None, [(won, _WINNER_CAPS)], TOTAL_CAPS - _WINNER_CAPS)
+        return _results(season_id,
+                        team.alias('team'),
+                        pw.Case(None, [(won, 1)], 0).alias('won'),
+                        pw.Case(None, [(Match.team_a_faction == allies_if, 1)], 0).alias('allies'),
+                        caps.alias('caps'))
+
+    sides = (_side(Match.team_a, Faction.ALLIES) + _side(Match.team_b, Faction.AXIS)).alias('sides')
+    query = (pw.Select([sides], [
+                sides.c.team,
+                pw.fn.COUNT(pw.SQL('*')),
+                pw.fn.SUM(sides.c.won),
+                pw.fn.SUM(sides.c.allies),
+                _count((sides.c.allies == 1) & (sides.c.won == 1)),
+                pw.fn.SUM(sides.c.caps),
+             ])
+             .group_by(sides.c.team)
+             .order_by(sides.c.team))
+
+    return [
+        TeamStats(team_id=team_id, matches=n, wins=wins, allies_matches=allies, allies_wins=allies_wins,
+                  axis_matches=n - allies, axis_wins=wins - allies_wins, caps_for=caps,
+                  caps_against=n * TOTAL_CAPS - caps)
+        for team_id, n, wins, allies, allies_wins, caps in db.proxy.execute(query).fetchall()
+    ]
+
+
+"""
+caching -- per season, None for all seasons
+"""
+
+_cache = TTLCache[tuple[str, int | None], list](ttl=STATS_CACHE_TTL)
+_generation = 0  # counts the invalidations, to not cache results that were computed meanwhile
+
+
+def invalidate(season_id: int | None) -> None:
+    """drop the statistics of a season, and those of all seasons"""
+    global _generation  # pylint: disable=global-statement
+    _generation += 1
+    for kind in ('maps', 'teams'):
+        _cache.invalidate((kind, season_id))
+        _cache.invalidate((kind, None))
+
+
+@events.match.add_handler
+async def _on_match_changed(data: events.MatchData) -> None:
+    # also covers the changes made by other processes
+    invalidate(data.season_id)
+
+
+def stats_cache_stats() -> dict[str, int]:
+    """size and hit/miss counters of the statistics cache"""
+    return _cache.stats()
+
+
+async def _cached(kind: str, season_id: int | None, aggregate) -> list:
+    key = (kind, season_id)
+    result = _cache.get(key)
+    if result is None:
+        generation = _generation
+        result = await db.run(aggregate, season_id)
+        if generation == _generation:
+            _cache.set(key, result)
+    return result
+
+
+"""
+model operations
+"""
+
+@validate_call
+async def get_map_stats(season_id: int | None = None) -> list[MapStats]:
+    """results per map, in a season or over all seasons"""
+    return await _cached('maps', season_id, _aggregate_maps)
+
+
+@validate_call
+async def get_stats_of_map(map_id: int, season_id: int | None = None) -> MapStats:
+    """results on a single map -- all zero if it was not played"""
+    for s in await get_map_stats(season_id):
+        if s.map_id == map_id:
+            return s
+    return MapStats(map_id=map_id, matches=0, allies_wins=0, axis_wins=0, allies_caps=0, axis_caps=0)
+
+
+@validate_call
+async def get_faction_stats(season_id: int | None = None) -> list[FactionStats]:
+    """results per faction -- rolled up from the results per map"""
+    maps = await get_map_stats(season_id)
+    matches = sum(s.matches for s in maps)
+    return [
+        FactionStats(faction=Faction.ALLIES, matches=matches, wins=sum(s.allies_wins for s in maps),
+                     caps=sum(s.allies_caps for s in maps)),
+        FactionStats(faction=Faction.AXIS, matches=matches, wins=sum(s.axis_wins for s in maps),
+                     caps=sum(s.axis_caps for s in maps)),
+    ]
+
+
+@validate_call
+async def get_team_stats(season_id: int | None = None) -> list[TeamStats]:
+    """results per team and faction, in a season or over all seasons"""
+    return await _cached('teams', season_id, _aggregate_teams)
@@ -4,12 +4,13 @@
 import uuid
 import peewee as pw
 from playhouse.shortcuts import model_to_dict
-from pydantic import BaseModel, validate_call, Field
+from pydantic import BaseModel, RootModel, validate_call, Field
 from quart_schema.pydantic import File
-from typing import Optional
+from typing import Optional, Self
 from pathlib import Path
 
-from match_manager import config
+from match_manager import config, events
+from match_manager.util import ReferenceCache
 from .db.team import Team, TeamManager
 from . import auth, db, user, audit
 
@@ -43,31 +44,86 @@ class TeamResponse(BaseModel):
     tag: str
     logo_filename: Optional[str] = Field(default=None)
     description: str = Field(default="")
-    # managers may be only included in single-team query results
+    # managers are included in single-team query results, and in lists on request
     managers: Optional[list[user.DiscordMemberInfo]] = Field(default=None)
 
+    @classmethod
+    def from_row(cls, row: dict) -> Self:
+        """fast path for lists: construct the response from a `.dicts()` row of a `Team` query, without validation"""
+        return cls.model_construct(**row)
+
+
+# a list of teams as a single model, so that list endpoints can skip the validation of every entry
+TeamResponseList = RootModel[list[TeamResponse]]
+
 
 """
 model operations, which use the pydantic validation, manage the database,
 and may handle permissions, events and logging in the future.
 """
 
+@db.threaded
+def _load_team_with_managers(team_id: int) -> tuple[Team, list[str]]:
+    """load a team and the discord ids of its managers"""
+    team = Team.get_by_id(team_id)
+    return team, [m.discord_user_id for m in team.managers]
+
+
 @validate_call
 async def get_team(team_id: int) -> TeamResponse:
     """fetch a team from the database"""
-    team = Team.get_by_id(team_id)
+    team, manager_ids = await _load_team_with_managers(team_id)
     response = TeamResponse(**model_to_dict(team))
     # since only a single team is queried, include extra information, i.e. the team managers
-
-    response.managers = [
-        u for m in team.managers if (u := await user.get_user(m.discord_user_id)) is not None
-    ]
+    managers = await user.get_users(manager_ids)
+    response.managers = [managers[uid] for uid in manager_ids if uid in managers]
     return response
 
 
-async def get_teams() -> list[TeamResponse]:
-    """fetch all teams from the database"""
-    return list(TeamResponse(**model_to_dict(t)) for t in Team.select())
+@db.threaded
+def _load_teams() -> list[TeamResponse]:
+    return [TeamResponse.from_row(row) for row in Team.select().order_by(Team.id).dicts()]
+
+
+@db.threaded
+def _load_manager_ids() -> dict[int, list[str]]:
+    """the discord ids of the managers of every team"""
+    manager_ids: dict[int, list[str]] = {}
+    for m in TeamManager.select(TeamManager.team, TeamManager.discord_user_id).order_by(TeamManager.id).tuples():
+        manager_ids.setdefault(m[0], []).append(m[1])
+    return manager_ids
+
+
+# teams rarely change -- keep them in memory, invalidated by the model operations below and the team events
+# (also those of other processes). The cached entries are shared, never modify them.
+_teams = ReferenceCache(_load_teams, key=lambda t: t.id)
+
+@events.team.add_handler
+async def _on_team_changed(_data: events.TeamData) -> None:
+    _teams.invalidate()
+
+
+def team_cache_stats() -> dict[str, int]:
+    """size and counters of the team cache"""
+    return _teams.stats()
+
+
+@validate_call
+async def get_teams(include_managers: bool = False) -> list[TeamResponse]:
+    """
+    fetch all teams.
+    If requested, the managers are included as well -- all of them are resolved in one go.
+    """
+    teams = await _teams.all()
+    if not include_managers:
+        return teams
+
+    manager_ids = await _load_manager_ids()
+    managers = await user.get_users([uid for uids in manager_ids.values() for uid in uids])
+    return [
+        t.model_copy(update={'managers': [managers[uid] for uid in manager_ids.get(t.id, []) if uid in managers]})
+        for t in teams
+    ]
 
 
 @validate_call
@@ -75,25 +131,29 @@ async def get_teams() -> list[TeamResponse]:
 @audit.log_call(description='{team_data}')
 async def create_new_team(team_data: NewTeamData, author: auth.User) -> TeamResponse:
     """create a new team"""
-    with db.proxy.atomic() as txn:
-        # create the team entry
-        t = Team(
-            name=team_data.name,
-            tag=team_data.tag,
-            description=team_data.description
-        )
-
-        # if provided, store the file
-        if team_data.logo:
-            # add a unique prefix to force browsers to load new files...
-            t.logo_filename = uuid.uuid4().hex + '_' + (team_data.logo.filename or '')
-
-            storage_path = Path(config.webserver.upload_folder) / "team_logos"
-            storage_path.mkdir(parents=True, exist_ok=True)
-            await team_data.logo.save(storage_path / t.logo_filename)
-
-        t.save()
+    # create the team entry
+    t = Team(
+        name=team_data.name,
+        tag=team_data.tag,
+        description=team_data.description
+    )
+
+    # if provided, store the file
+    if team_data.logo:
+        # add a unique prefix to force browsers to load new files...
+        t.logo_filename = uuid.uuid4().hex + '_' + (team_data.logo.filename or '')
+
+        storage_path = Path(config.webserver.upload_folder) / "team_logos"
+        storage_path.mkdir(parents=True, exist_ok=True)
+        await team_data.logo.save(storage_path / t.logo_filename)
+
+    def _store():
+        with db.proxy.atomic() as txn:
+            t.save()
+            db.on_commit(_teams.invalidate)
+            db.emit(events.team_created, events.TeamData(id=t.id, name=t.name))
 
+    await db.run(_store)
     return TeamResponse(**model_to_dict(t))
 
 
@@ -102,44 +162,56 @@ async def create_new_team(team_data: NewTeamData, author: auth.User) -> TeamResp
 @audit.log_call(description='{team_id}: {update}')
 async def update_team_data(team_id: int, update: UpdateTeamData, author: auth.User) -> TeamResponse:
     """patch an existing team"""
-    with db.proxy.atomic() as txn:
-        t = Team.get_by_id(team_id)
-
-        t.name = t.name if update.name is None else update.name
-        t.tag = t.tag if update.tag is None else update.tag
-        t.description = t.description if update.description is None else update.description
-
-        if update.managers is not None:
-            # remove all team managers that are not in the new list
-            TeamManager.delete().where(
-                (TeamManager.team==t) &
-                TeamManager.discord_user_id.not_in(update.managers) # type: ignore
-            ).execute()
+    new_logo = None
+    if update.logo:
+        # save the new logo first, the database only references it
+        new_logo = uuid.uuid4().hex + '_' + (update.logo.filename or '')
 
-            # add all that are missing
-            for uid in update.managers:
-                TeamManager.get_or_create(discord_user_id=uid, team=t)
+        storage_path = Path(config.webserver.upload_folder) / "team_logos"
+        storage_path.mkdir(parents=True, exist_ok=True)
+        await update.logo.save(storage_path / new_logo)
 
-        t.save()
+    def _update() -> tuple[Team, str | None, list[str]]:
+        with db.proxy.atomic() as txn:
+            t = Team.get_by_id(team_id)
+            old_managers = [m.discord_user_id for m in t.managers]
 
-        if update.logo:
             # remember the old logo name
             old_logo = t.logo_filename
 
-            # save the new logo
-            t.logo_filename = uuid.uuid4().hex + '_' + (update.logo.filename or '')
+            t.name = t.name if update.name is None else update.name
+            t.tag = t.tag if update.tag is None else update.tag
+            t.description = t.description if update.description is None else update.description
+            t.logo_filename = new_logo or t.logo_filename
 
-            storage_path = Path(config.webserver.upload_folder) / "team_logos"
-            storage_path.mkdir(parents=True, exist_ok=True)
-            await update.logo.save(storage_path / t.logo_filename)
+            if update.managers is not None:
+                # remove all team managers that are not in the new list
+                TeamManager.delete().where(
+                    (TeamManager.team==t) &
+                    TeamManager.discord_user_id.not_in(update.managers) # type: ignore
+                ).execute()
+
+                # add all that are missing
+                for uid in update.managers:
+                    TeamManager.get_or_create(discord_user_id=uid, team=t)
 
-            # save the team and clean up
             t.save()
-            if old_logo:
-                try:
-                    (Path(config.webserver.upload_folder) / "team_logos" / old_logo).unlink()
-                except:
-                    pass
+            db.on_commit(_teams.invalidate)
+            db.emit(events.team_updated, events.TeamData(id=t.id, name=t.name))
+        return t, old_logo, old_managers
+
+    t, old_logo, old_managers = await db.run(_update)
+
+    if update.managers is not None:
+        # permissions of the previous and new managers changed
+        auth.invalidate_user_info(*old_managers, *update.managers)
+
+    # clean up
+    if new_logo and old_logo:
+        try:
+            (Path(config.webserver.upload_folder) / "team_logos" / old_logo).unlink()
+        except:
+            pass
 
     return TeamResponse(**model_to_dict(t))
 
@@ -149,8 +221,17 @@ async def update_team_data(team_id: int, update: UpdateTeamData, author: auth.Us
 @audit.log_call(description='{team_id}')
 async def delete_team(team_id: int, author: auth.User):
     """delete a team by its id"""
+    managers = await _delete_team(team_id)
+    # the managers lost their permissions for this team
+    auth.invalidate_user_info(*managers)
+
+
+@db.threaded
+def _delete_team(team_id: int) -> list[str]:
+    """deletes the team and its logo, returns the ids of its (former) managers"""
     with db.proxy.atomic() as txn:
         t = Team.get_by_id(team_id)
+        managers = [m.discord_user_id for m in t.managers]
         if t.logo_filename:
             logo = (Path(config.webserver.upload_folder) / "team_logos" / t.logo_filename)
             try:
@@ -159,3 +240,6 @@ async def delete_team(team_id: int, author: auth.User):
                 pass # just ignore errors, nothing we can do if this fails
 
         t.delete_instance()
+        db.on_commit(_teams.invalidate)
+        db.emit(events.team_deleted, events.TeamData(id=t.id, name=t.name))
+    return managers
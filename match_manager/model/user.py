@@ -1,11 +1,21 @@
 """model functions regarding _any_ user on the tournament discord"""
 
+from bisect import bisect_left, insort
+from collections import defaultdict
 from itertools import islice
 from typing import Self
+import asyncio
+import heapq
+import logging
+
 from pydantic import BaseModel, validate_call
 import discord
 
-from match_manager import bot
+from match_manager import bot, events
+from match_manager.util import TTLCache
+
+logger = logging.getLogger(__name__)
+
 
 class DiscordMemberInfo(BaseModel):
     """basic info about any member on the discord"""
@@ -25,17 +35,200 @@ class DiscordMemberInfo(BaseModel):
         )
 
 
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class MemberSearchIndex:
+    """
+    Search index on the (lowercased) display names of the members of the admin guild.
+
+    - a sorted list of (name, id) for prefix lookups by bisection
+    - an inverted trigram index for substring lookups: candidates are members that have all trigrams of the
+      search term, which are then verified. Search terms shorter than 3 characters are matched by prefix first,
+      and by a scan that stops as soon as enough results were found.
+
+    Results are ranked: exact match, prefix, prefix of a word in the name, any other substring -- each in
+    alphabetical order.
+    """
+    def __init__(self) -> None:
+        self._names: dict[int, str] = {}
+        self._sorted: list[tuple[str, int]] = []
+        self._trigrams: defaultdict[str, set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def clear(self) -> None:
+        self._names.clear()
+        self._sorted.clear()
+        self._trigrams.clear()
+
+    def build(self, members: list[tuple[int, str]]) -> None:
+        """(re-)build the index from scratch, for a list of (member id, display name)"""
+        self.clear()
+        for member_id, name in members:
+            name = name.lower()
+            self._names[member_id] = name
+            for trigram in _trigrams(name):
+                self._trigrams[trigram].add(member_id)
+        self._sorted = sorted((name, member_id) for member_id, name in self._names.items())
+
+    def add(self, member_id: int, name: str) -> None:
+        """add a member, or update its name"""
+        name = name.lower()
+        if self._names.get(member_id) == name:
+            return
+        self.remove(member_id)
+
+        self._names[member_id] = name
+        insort(self._sorted, (name, member_id))
+        for trigram in _trigrams(name):
+            self._trigrams[trigram].add(member_id)
+
+    def remove(self, member_id: int) -> None:
+        name = self._names.pop(member_id, None)
+        if name is None:
+            return
+
+        pos = bisect_left(self._sorted, (name, member_id))
+        del self._sorted[pos]
+        for trigram in _trigrams(name):
+            ids = self._trigrams[trigram]
+            ids.discard(member_id)
+            if not ids:
+                del self._trigrams[trigram]
+
+    def _prefixed(self, search: str):
+        """(name, id) of all members whose name starts with `search`, in alphabetical order"""
+        for pos in range(bisect_left(self._sorted, (search,)), len(self._sorted)):
+            name, member_id = self._sorted[pos]
+            if not name.startswith(search):
+                return
+            yield name, member_id
+
+    def _containing(self, search: str):
+        """(name, id) of all members whose name contains `search`, but does not start with it"""
+        if len(search) >= 3:
+            postings = sorted((self._trigrams.get(t, set()) for t in _trigrams(search)), key=len)
+            names = ((self._names[i], i) for i in set.intersection(*postings))
+        else:
+            names = ((name, i) for i, name in self._names.items())
+
+        return ((name, i) for name, i in names if search in name and not name.startswith(search))
+
+    def search(self, search: str, max_results: int = 10) -> list[int]:
+        """ids of the best `max_results` matching members"""
+        search = search.lower()
+        if not search or max_results <= 0:
+            return []
+
+        # prefix matches come in order from the sorted list -- the exact match, if any, first
+        found = list(islice(self._prefixed(search), max_results))
+        missing = max_results - len(found)
+
+        if missing > 0:
+            others = self._containing(search)
+            if len(search) < 3:
+                # without trigrams, this is a scan -- stop it once enough were found
+                others = islice(others, missing)
+
+            def rank(candidate: tuple[str, int]):
+                name, _ = candidate
+                return f' {search}' not in name, candidate  # prefix of another word in the name first
+
+            found.extend(heapq.nsmallest(missing, others, key=rank))
+
+        return [member_id for _, member_id in found]
+
+
+_index = MemberSearchIndex()
+_index_complete = False  # false as long as the index was not built from a fully loaded member list
+
+
+def _ensure_index(guild: discord.Guild) -> None:
+    """
+    Build the index on first use. Members of large guilds are loaded in chunks after the bot connected,
+    so an index built before that is rebuilt until the guild is complete.
+    """
+    global _index_complete  # pylint: disable=global-statement
+
+    if _index_complete:
+        return
+    if len(_index) == 0 or guild.chunked:
+        _index.build([(m.id, m.display_name) for m in guild.members])
+        _index_complete = guild.chunked
+        logger.info('member search index built with %d members', len(_index))
+
+
+@events.member_joined.add_handler
+@events.member_updated.add_handler
+async def _on_member_changed(data: events.MemberData) -> None:
+    if len(_index) == 0:
+        return  # not built, yet
+
+    member = bot.get().get_admin_guild().get_member(int(data.user_id))
+    if member is not None:
+        _index.add(member.id, member.display_name)
+
+
+@events.member_removed.add_handler
+async def _on_member_removed(data: events.MemberData) -> None:
+    _index.remove(int(data.user_id))
+
+
+# members that are not in the gateway cache are fetched through the (rate-limited) REST api,
+# so limit the number of lookups in flight
+MAX_CONCURRENT_LOOKUPS = 8
+PROFILE_CACHE_TTL = 300
+
+# member profiles by user id, None for users that are not on the discord
+_profile_cache = TTLCache[str, DiscordMemberInfo | None](ttl=PROFILE_CACHE_TTL)
+_lookup_limit = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+
+
+@events.member.add_handler
+async def _on_member_event(data: events.MemberData) -> None:
+    _profile_cache.invalidate(data.user_id)
+
+
+def profile_cache_stats() -> dict[str, int]:
+    """statistics of the member profile cache"""
+    return _profile_cache.stats()
+
+
 @validate_call
 async def search_user(search: str, max_results: int = 10) -> list[DiscordMemberInfo]:
-    """searches for discord members, and returns a list of results"""
-    search = search.lower()
+    """searches for discord members, and returns a list of results -- best matches first"""
     guild = bot.get().get_admin_guild()
-    members = filter(lambda m: search in m.display_name.lower(), guild.members)
-    return list(islice(map(DiscordMemberInfo.from_discord, members), max_results))
+    _ensure_index(guild)
+
+    members = (guild.get_member(member_id) for member_id in _index.search(search, max_results))
+    return [DiscordMemberInfo.from_discord(m) for m in members if m is not None]
+
+
+async def _lookup_user(user_id: str) -> DiscordMemberInfo | None:
+    async def _load() -> DiscordMemberInfo | None:
+        async with _lookup_limit:
+            member = await bot.get().get_admin_guild_member(user_id)
+        return member and DiscordMemberInfo.from_discord(member)
+
+    # not cached if the member changes meanwhile, the profile might be outdated already
+    return await _profile_cache.get_or_load(user_id, _load)
 
 
 @validate_call
 async def get_user(user_id: str) -> DiscordMemberInfo | None:
     """returns information for a selected user id"""
-    member = await bot.get().get_admin_guild_member(user_id)
-    return member and DiscordMemberInfo.from_discord(member)
+    return await _lookup_user(user_id)
+
+
+@validate_call
+async def get_users(user_ids: list[str]) -> dict[str, DiscordMemberInfo]:
+    """
+    Returns information for many users at once, by user id -- users that are not on the discord are omitted.
+    Every distinct user is resolved only once, and lookups run concurrently.
+    """
+    unique_ids = list(dict.fromkeys(user_ids))
+    infos = await asyncio.gather(*(_lookup_user(uid) for uid in unique_ids))
+    return {uid: info for uid, info in zip(unique_ids, infos) if info is not None}
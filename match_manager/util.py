@@ -1,9 +1,15 @@
-from collections.abc import Callable
-from typing import Generic, Type, TypeVar
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, Generic, Type, TypeVar
+import asyncio
 import inspect
+import json
+import time
 
 
 T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
 
 class ArgExtractor(Generic[T]):
     def __init__(self, function: Callable, arg_name: str, arg_type: Type[T] | None):
@@ -33,3 +39,188 @@ class ArgExtractor(Generic[T]):
                 if self._param.name in kwargs:
                     return kwargs[self._param.name]
                 return args[self._index]
+
+
+_MISSING = object()
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, ttl: float, max_size: int = 10_000):
+        """
+        A simple in-process cache whose entries expire after `ttl` seconds.
+        When full, expired entries are dropped first, then the oldest ones.
+        Counts hits and misses, see `stats()`. Not thread-safe, use it from the event loop only.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: dict[K, tuple[float, V]] = {}
+        self._loading: dict[K, list[int]] = {}  # keys being loaded: [loads in progress, invalidations meanwhile]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K, default=None) -> V | None:
+        """returns the cached value, or `default` if there is none or it expired"""
+        value = self.lookup(key)
+        return default if value is _MISSING else value # type: ignore
+
+    def lookup(self, key: K) -> V | object:
+        """like `get`, but returns the `TTLCache.MISSING` sentinel on a miss -- to allow caching `None`"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return _MISSING
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """store a value, optionally with a ttl that differs from the default"""
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            self._evict()
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    async def get_or_load(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        """
+        returns the cached value, or else the one `load` returns -- which is stored, unless the entry is
+        invalidated while loading: the loaded value may be outdated already
+        """
+        value = self.lookup(key)
+        if value is not _MISSING:
+            return value # type: ignore
+
+        loading = self._loading.setdefault(key, [0, 0])
+        loading[0] += 1
+        invalidations = loading[1]
+        try:
+            value = await load()
+        finally:
+            loading[0] -= 1
+            if not loading[0]:
+                del self._loading[key]
+        if loading[1] == invalidations:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: K) -> None:
+        """drop a single entry"""
+        self._entries.pop(key, None)
+        if key in self._loading:
+            self._loading[key][1] += 1
+
+    def clear(self) -> None:
+        """drop all entries"""
+        self._entries.clear()
+        for loading in self._loading.values():
+            loading[1] += 1
+
+    def stats(self) -> dict[str, int]:
+        """size and hit/miss counters"""
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_size:
+            # dicts keep the insertion order, so this is the oldest entry
+            del self._entries[next(iter(self._entries))]
+
+    MISSING = _MISSING
+
+
+class ReferenceCache(Generic[K, V]):
+    def __init__(self, load: Callable[[], Awaitable[list[V]]], key: Callable[[V], K], max_age: float | None = 600):
+        """
+        A read-through cache for a whole, small collection that rarely changes, e.g. all teams: `load` fetches
+        all entries at once, which are then served from memory and indexed by `key`, until `invalidate` is called
+        -- or, as a safety net for changes that were not announced (e.g. made by another process without the
+        event bus), after `max_age` seconds.
+
+        Concurrent misses share a single load. Loads are versioned: a load that was started before an invalidation
+        serves the callers that were already waiting for it, but its result is not kept.
+        Not thread-safe, use it from the event loop only.
+        """
+        self._load = load
+        self._key = key
+        self.max_age = max_age
+        self._version = 0
+        self._entries: list[V] | None = None
+        self._index: dict[K, V] = {}
+        self._loaded_at = 0.0
+        self._loading: tuple[int, asyncio.Future[tuple[list[V], dict[K, V]]]] | None = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    async def all(self) -> list[V]:
+        """all entries, in the order they were loaded -- the list is a copy, the entries are shared"""
+        entries, _ = await self._current()
+        return list(entries)
+
+    async def get(self, key: K) -> V | None:
+        """a single entry by its key, or None if there is no such entry"""
+        _, index = await self._current()
+        return index.get(key)
+
+    def invalidate(self) -> None:
+        """drop all entries, they are loaded again on the next access"""
+        self._version += 1
+        self._entries = None
+        self._index = {}
+        self.invalidations += 1
+
+    def stats(self) -> dict[str, int]:
+        """size, hit/miss counters, and the number of loads and invalidations"""
+        return {
+            'size': len(self._entries) if self._entries is not None else 0,
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'invalidations': self.invalidations,
+        }
+
+    async def _current(self) -> tuple[list[V], dict[K, V]]:
+        if self._entries is not None:
+            if self.max_age is None or time.monotonic() - self._loaded_at < self.max_age:
+                self.hits += 1
+                return self._entries, self._index
+            self._entries = None
+            self._index = {}
+
+        self.misses += 1
+        if self._loading is None or self._loading[0] != self._version:
+            # the load runs as a task of its own, so that a cancelled caller does not cancel it for the others
+            self._loading = (self._version, asyncio.ensure_future(self._fetch(self._version)))
+        return await asyncio.shield(self._loading[1])
+
+    async def _fetch(self, version: int) -> tuple[list[V], dict[K, V]]:
+        self.loads += 1
+        try:
+            entries = await self._load()
+        finally:
+            if self._loading is not None and self._loading[0] == version:
+                self._loading = None
+
+        index = {self._key(e): e for e in entries}
+        if version == self._version:
+            self._entries, self._index, self._loaded_at = entries, index, time.monotonic()
+        return entries, index
+
+
+def encode_cursor(*values: Any) -> str:
+    """encode the sort key values of the last entry of a page as an opaque cursor for keyset pagination"""
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, num_values: int) -> list:
+    """decode a cursor created by `encode_cursor`, raises a ValueError if it is malformed"""
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except ValueError as e:
+        raise ValueError('Invalid cursor.') from e
+    if not isinstance(values, list) or len(values) != num_values:
+        raise ValueError('Invalid cursor.')
+    return values
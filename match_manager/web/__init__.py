@@ -10,10 +10,11 @@ from quart_cors import cors
 from quart_schema import QuartSchema, hide, RequestSchemaValidationError, ResponseSchemaValidationError
 from pydantic import ValidationError
 
-from .. import config
-from .api import login, team, user, season, audit, map as game_map, match as game_match
+from .. import config, events
+from .api import login, team, user, season, audit, debug, live, map as game_map, match as game_match
+from .live import broker as live_broker
 
-from match_manager.model import auth
+from match_manager.model import auth, audit as audit_log, db
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,42 @@ logger = logging.getLogger(__name__)
 app = Quart(__name__, static_url_path='/', static_folder='client/build')
 app = cors(app)
 QuartSchema(app, swagger_ui_path='/api/docs')
+# let pydantic produce json-compatible values (enums, datetimes, ...) right away -- much faster than
+# falling back to the json encoders default-hook for every single value of large responses
+app.config['QUART_SCHEMA_PYDANTIC_DUMP_OPTIONS'] = {'mode': 'json'}
+
+@app.teardown_request
+async def release_db_connection(_exc: BaseException | None):
+    """queries are executed by the database workers, but make sure nothing leaks from the request itself"""
+    db.release_connection()
+
+_event_bus: db.PostgresEventBus | None = None
+
+@app.before_serving
+async def start_background_services():
+    """audit entries are written in batches in the background, and events are shared with other processes"""
+    global _event_bus  # pylint: disable=global-statement
+
+    audit_log.sink.start()
+
+    if config.database.event_bus:
+        _event_bus = db.PostgresEventBus(db.proxy.obj)
+        await _event_bus.start()
+        events.set_transport(_event_bus)
+
+@app.after_serving
+async def close_db_pool():
+    """
+    stop sharing events, finish the queued event handlers, end the live-update streams, write pending audit entries,
+    finish pending database work and close all connections
+    """
+    if _event_bus is not None:
+        events.set_transport(None)
+        await _event_bus.stop()
+    await events.dispatcher.stop()
+    live_broker.close()
+    await audit_log.sink.stop()
+    db.shutdown()
 
 @app.errorhandler(RequestSchemaValidationError)
 async def handle_request_validation_error(error: RequestSchemaValidationError):
@@ -118,6 +155,8 @@ app.register_blueprint(season.blue)
 app.register_blueprint(audit.blue)
 app.register_blueprint(game_map.blue)
 app.register_blueprint(game_match.blue)
+app.register_blueprint(debug.blue)
+app.register_blueprint(live.blue)
 
 # The react app does client-side routing for different component pages.
 # This works fine when starting from the index page '/', as the react router will catch links to
@@ -1,15 +1,21 @@
 """api to access the audit logs"""
 
 from datetime import datetime, timezone
+from typing import Literal
+import csv
+import io
+import json
 import logging
 from http import HTTPStatus
 
-from quart import Blueprint, request
+from quart import Blueprint, Response, request
 from quart_schema import validate_response, validate_querystring
 from pydantic import BaseModel, Field, field_validator
 
 from match_manager import model
+from match_manager.model import auth
 from match_manager.model.validation import UtcAwareBaseModel
+from match_manager.web.api.login import requires_login
 
 blue = Blueprint('audit', __name__, url_prefix='/api/audit')
 logger = logging.getLogger(__name__)
@@ -24,3 +30,60 @@ class LogSearchQuery(UtcAwareBaseModel):
 async def search_user(query_args: LogSearchQuery) -> list[model.audit.AuditEventData]:
     """returns audit log entries older than the given datetime (or the newest ones=)"""
     return await model.audit.fetch_log(query_args.timestamp, 20)
+
+
+@blue.route('/search', methods=['GET'])
+@requires_login()
+@validate_querystring(model.audit.AuditSearchQuery)
+@validate_response(model.audit.AuditSearchPage)
+async def search_log(query_args: model.audit.AuditSearchQuery, author: auth.User) -> model.audit.AuditSearchPage:
+    """
+    search the audit log by author, event type (prefix, e.g. 'match.*'), text and time range -- newest first.
+    Admins only.
+    """
+    return await model.audit.search_log(query_args, author)
+
+
+class ExportQuery(model.audit.AuditFilter):
+    format: Literal['ndjson', 'csv'] = 'ndjson'
+
+
+_EXPORT_COLUMNS = ['id', 'timestamp', 'author', 'event_type', 'event_description']
+
+def _export_row(row: dict) -> dict:
+    # the timestamps are loaded as naive utc datetimes
+    return {**row, 'timestamp': row['timestamp'].replace(tzinfo=timezone.utc).isoformat()}
+
+
+@blue.route('/export', methods=['GET'])
+@requires_login()
+@validate_querystring(ExportQuery)
+async def export_log(query_args: ExportQuery, author: auth.User):
+    """streams the (filtered) audit log as newline-delimited json or csv, oldest first -- admins only"""
+    chunks = await model.audit.export_log(query_args, author)
+
+    async def ndjson():
+        async for rows in chunks:
+            yield ''.join(json.dumps(_export_row(row)) + '\n' for row in rows)
+
+    async def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=_EXPORT_COLUMNS)
+        writer.writeheader()
+        async for rows in chunks:
+            writer.writerows(_export_row(row) for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()  # the header, if there were no rows at all
+
+    if query_args.format == 'csv':
+        response = Response(csv_lines(), mimetype='text/csv')
+        filename = 'audit_log.csv'
+    else:
+        response = Response(ndjson(), mimetype='application/x-ndjson')
+        filename = 'audit_log.ndjson'
+
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.timeout = None  # large exports may take a while
+    return response
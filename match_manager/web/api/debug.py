@@ -0,0 +1,36 @@
+"""diagnostics for admins, e.g. cache statistics"""
+
+import logging
+
+from quart import Blueprint
+
+from match_manager import bot, events
+from match_manager.model import auth, user, team, season, stats, map as game_map
+from match_manager.web.api.login import requires_login
+from match_manager.web.live import broker as live_broker
+
+blue = Blueprint('debug', __name__, url_prefix='/api/debug')
+logger = logging.getLogger(__name__)
+
+
+@blue.route('/cache-stats', methods=['GET'])
+@requires_login()
+async def cache_stats(author: auth.User):
+    """size and hit/miss counters of the in-process caches, and the counters of the event dispatcher, live updates and notifications"""
+    if not author.is_admin:
+        raise auth.PermissionDenied('You require admin rights to inspect the caches.')
+
+    return {
+        'user_info': auth.user_info_cache_stats(),
+        'discord_members': bot.get().member_cache_stats(),
+        'member_profiles': user.profile_cache_stats(),
+        'reference_data': {
+            'teams': team.team_cache_stats(),
+            'maps': game_map.map_cache_stats(),
+            'seasons': season.season_cache_stats(),
+        },
+        'statistics': stats.stats_cache_stats(),
+        'live_updates': live_broker.stats(),
+        'events': events.dispatcher.stats(),
+        'notifications': bot.get().notifications and bot.get().notifications.stats(),
+    }
@@ -0,0 +1,49 @@
+"""live updates of matches, groups, teams and seasons, as server-sent events"""
+
+import asyncio
+import logging
+
+from quart import Blueprint, Response
+from quart_schema import validate_querystring
+from pydantic import BaseModel
+
+from match_manager.web.live import broker
+
+blue = Blueprint('live', __name__, url_prefix='/api/live')
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 20  # seconds -- keeps proxies from closing idle streams
+
+
+class LiveQuery(BaseModel):
+    season: int | None = None
+    group: int | None = None
+    team: int | None = None
+
+
+@blue.route('/events', methods=['GET'])
+@validate_querystring(LiveQuery)
+async def live_events(query_args: LiveQuery):
+    """
+    A stream of server-sent events, each a json object `{"type": "match.updated", "data": {...}}`,
+    optionally limited to a season, group and/or team. If the stream ends (e.g. because the client could not keep
+    up), the browser reconnects automatically and should reload its data.
+    """
+    async def stream():
+        with broker.subscribe(season=query_args.season, group=query_args.group, team=query_args.team) as sub:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    frames = await asyncio.wait_for(sub.get(), KEEPALIVE_INTERVAL)
+                except TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if frames is None:
+                    return
+                yield ''.join(frames)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    response.timeout = None
+    return response
@@ -2,31 +2,49 @@
 
 from http import HTTPStatus
 from pathlib import Path
+from pydantic import BaseModel
 from quart import Blueprint, send_from_directory
-from quart_schema import DataSource, validate_request, validate_response
+from quart_schema import DataSource, validate_querystring, validate_request, validate_response
 
 
 from match_manager import config
-from match_manager.model import auth, map as model
-from match_manager.model.map import MapResponse, NewMapData, UpdateMapData
+from match_manager.model import auth, stats, map as model
+from match_manager.model.map import MapResponse, MapResponseList, NewMapData, UpdateMapData
 from match_manager.model.team import UpdateTeamData
 from match_manager.web.api.login import requires_login
+from match_manager.web.etag import conditional
 
 blue = Blueprint('maps', __name__, url_prefix='/api/maps')
 
 
 @blue.route('/', methods=['GET'])
-@validate_response(list[MapResponse])
-async def list_maps() -> list[MapResponse]:
+@conditional('maps')
+@validate_response(MapResponseList)
+async def list_maps() -> MapResponseList:
     """list all maps"""
-    return await model.get_maps()
+    return MapResponseList.model_construct(await model.get_maps())
 
 
 @blue.route('/<int:map_id>', methods=['GET']) # type: ignore
+@conditional('maps')
 @validate_response(MapResponse)
 async def get_map(map_id: int) -> MapResponse:
     """returns info of a single map, by id"""
-    return next(filter(lambda m: m.id == map_id, await model.get_maps()))
+    return await model.get_map(map_id)
+
+
+class MapStatsQuery(BaseModel):
+    season_id: int | None = None
+
+
+@blue.route('/<int:map_id>/stats', methods=['GET']) # type: ignore
+@conditional('maps', 'matches')
+@validate_querystring(MapStatsQuery)
+@validate_response(stats.MapStats)
+async def get_map_stats(map_id: int, query_args: MapStatsQuery) -> stats.MapStats:
+    """results on a map, over all seasons or with `?season_id=` in a single one"""
+    await model.get_map(map_id)  # 404 for unknown maps
+    return await stats.get_stats_of_map(map_id, query_args.season_id)
 
 
 @blue.route('/', methods=['POST']) # type: ignore
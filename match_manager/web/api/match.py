@@ -3,12 +3,13 @@
 from datetime import datetime
 from http import HTTPStatus
 from quart import Blueprint
-from quart_schema import validate_request, validate_response
+from quart_schema import validate_querystring, validate_request, validate_response
 
 from match_manager.model import match as model, auth
 from match_manager.model.audit import UtcAwareBaseModel
 from match_manager.model.db.match import MatchCapScore
 from match_manager.web.api.login import requires_login
+from match_manager.web.etag import conditional
 
 from pydantic import BaseModel
 
@@ -16,27 +17,32 @@ blue = Blueprint('matches', __name__, url_prefix='/api/matches')
 
 
 @blue.route('/', methods=['GET'])
-@validate_response(list[model.MatchResponse])
-async def list_matches() -> list[model.MatchResponse]:
-    """lists matches. TODO: restrict this!"""
-    return await model.list_matches()
+@conditional('matches')
+@validate_querystring(model.MatchListQuery)
+@validate_response(model.MatchPage)
+async def list_matches(query_args: model.MatchListQuery) -> model.MatchPage:
+    """lists matches, filtered and paginated (pass `next_cursor` as `cursor` to get the next page)"""
+    return await model.list_matches(query_args)
 
 
 @blue.route('/in-planning', methods=['GET'])
-@validate_response(list[model.MatchResponse])
-async def list_matches_in_planning() -> list[model.MatchResponse]:
+@conditional('matches')
+@validate_response(model.MatchResponseList)
+async def list_matches_in_planning() -> model.MatchResponseList:
     """list matches that are in planning"""
-    return await model.list_matches_in_planning()
+    return model.MatchResponseList.model_construct(await model.list_matches_in_planning())
 
 
 @blue.route('/waiting-for-result', methods=['GET'])
-@validate_response(list[model.MatchResponse])
-async def list_matches_waiting_for_result() -> list[model.MatchResponse]:
+@conditional('matches')
+@validate_response(model.MatchResponseList)
+async def list_matches_waiting_for_result() -> model.MatchResponseList:
     """list matches that are waiting for a result"""
-    return await model.list_matches_waiting_for_result()
+    return model.MatchResponseList.model_construct(await model.list_matches_waiting_for_result())
 
 
 @blue.route('/<int:match_id>', methods=['GET']) # type: ignore
+@conditional('matches')
 @validate_response(model.MatchResponse)
 async def get_match(match_id: int):
     """get a single match"""
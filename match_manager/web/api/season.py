@@ -5,15 +5,17 @@ from typing import List
 from quart import Blueprint
 from quart_schema import validate_request, validate_response
 
-from match_manager.model import season as model, auth, game_match
-from match_manager.model.match import MatchResponse
+from match_manager.model import season as model, auth, game_match, dashboard, ratings, standings, stats
+from match_manager.model.match import MatchResponseList
 from match_manager.web.api.login import requires_login
+from match_manager.web.etag import conditional
 
 
 blue = Blueprint('seasons', __name__, url_prefix='/api/seasons')
 
 
 @blue.route('/', methods=['GET'])
+@conditional('seasons')
 @validate_response(List[model.SeasonOverview])
 async def list_seasons() -> List[model.SeasonOverview]:
     """lists all seasons"""
@@ -30,6 +32,7 @@ async def create_season(data: model.NewSeasonData, author: auth.User) -> model.S
 
 
 @blue.route('/<int:season_id>', methods=['GET']) # type: ignore
+@conditional('seasons')
 @validate_response(model.SeasonResponse)
 async def get_season(season_id: int) -> model.SeasonResponse:
     """get a single season"""
@@ -37,27 +40,109 @@ async def get_season(season_id: int) -> model.SeasonResponse:
 
 
 @blue.route('/<int:season_id>/matches', methods=['GET']) # type: ignore
-@validate_response(list[MatchResponse])
+@conditional('matches', 'seasons')
+@validate_response(MatchResponseList)
 async def get_matches_in_season(season_id: int):
     """returns all matches in the season"""
     matches = await game_match.list_matches_in_season(season_id)
-    return matches
+    return MatchResponseList.model_construct(matches)
+
+
+@blue.route('/<int:season_id>/dashboard', methods=['GET']) # type: ignore
+@conditional('seasons', 'matches', 'teams', 'maps')
+@validate_response(dashboard.SeasonDashboard)
+async def get_season_dashboard(season_id: int) -> dashboard.SeasonDashboard:
+    """the season with its groups, matches, and the teams and maps they reference -- in one response"""
+    return await dashboard.get_season_dashboard(season_id)
+
+
+@blue.route('/<int:season_id>/ratings', methods=['GET']) # type: ignore
+@conditional('matches', 'ratings')
+@validate_response(List[ratings.TeamRatingResponse])
+async def get_season_ratings(season_id: int) -> List[ratings.TeamRatingResponse]:
+    """the current ratings of the teams in the season, best first"""
+    return await ratings.get_season_ratings(season_id)
+
+
+@blue.route('/<int:season_id>/ratings/<int:team_id>', methods=['GET']) # type: ignore
+@conditional('matches', 'ratings')
+@validate_response(List[ratings.RatingPoint])
+async def get_rating_history(season_id: int, team_id: int) -> List[ratings.RatingPoint]:
+    """the rating of a team in the season after each of its matches, e.g. for a chart"""
+    return await ratings.get_rating_history(season_id, team_id)
+
+
+@blue.route('/ratings/recompute', methods=['POST']) # type: ignore
+@requires_login()
+async def recompute_ratings(author: auth.User):
+    """recompute the ratings of all seasons from the match results"""
+    return {'matches': await ratings.recompute_ratings(author)}
+
+
+@blue.route('/<int:season_id>/stats/maps', methods=['GET']) # type: ignore
+@conditional('matches')
+@validate_response(List[stats.MapStats])
+async def get_map_stats(season_id: int) -> List[stats.MapStats]:
+    """results per map in the season"""
+    return await stats.get_map_stats(season_id)
+
+
+@blue.route('/<int:season_id>/stats/factions', methods=['GET']) # type: ignore
+@conditional('matches')
+@validate_response(List[stats.FactionStats])
+async def get_faction_stats(season_id: int) -> List[stats.FactionStats]:
+    """results per faction in the season"""
+    return await stats.get_faction_stats(season_id)
+
+
+@blue.route('/<int:season_id>/stats/teams', methods=['GET']) # type: ignore
+@conditional('matches')
+@validate_response(List[stats.TeamStats])
+async def get_team_stats(season_id: int) -> List[stats.TeamStats]:
+    """results per team and faction in the season"""
+    return await stats.get_team_stats(season_id)
 
 
 @blue.route('/groups/<int:group_id>/matches', methods=['GET']) # type: ignore
-@validate_response(list[MatchResponse])
+@conditional('matches')
+@validate_response(MatchResponseList)
 async def get_matches_in_group(group_id: int):
     """return all matches in a given match-group"""
-    return await game_match.list_matches_in_group(group_id)
+    return MatchResponseList.model_construct(await game_match.list_matches_in_group(group_id))
 
 
 @blue.route('/groups/<int:group_id>', methods=['GET']) # type: ignore
+@conditional('seasons')
 @validate_response(model.MatchGroupResponse)
 async def get_group(group_id: int):
     """get a single group"""
     return await model.get_match_group(group_id)
 
 
+@blue.route('/groups/<int:group_id>/standings', methods=['GET']) # type: ignore
+@conditional('matches', 'seasons', 'standings')
+@validate_response(standings.GroupStandings)
+async def get_group_standings(group_id: int) -> standings.GroupStandings:
+    """the ranked standings of a match group"""
+    return await standings.get_standings(group_id)
+
+
+@blue.route('/standings/rebuild', methods=['POST']) # type: ignore
+@requires_login()
+async def rebuild_standings(author: auth.User):
+    """recompute all standings from the match results, e.g. to check them -- reports the corrected rows"""
+    return {'corrected': await standings.rebuild_standings(author)}
+
+
+@blue.route('/groups/<int:group_id>/fixtures', methods=['POST']) # type: ignore
+@requires_login()
+@validate_request(game_match.NewFixturesData)
+@validate_response(MatchResponseList, HTTPStatus.CREATED)
+async def create_fixtures(group_id: int, data: game_match.NewFixturesData, author: auth.User):
+    """create all matches of a round-robin between the teams of the group"""
+    return MatchResponseList.model_construct(await game_match.create_fixtures(group_id, data, author)), HTTPStatus.CREATED
+
+
 @blue.route('/groups', methods=['POST']) # type: ignore
 @requires_login()
 @validate_request(model.NewMatchGroupData)
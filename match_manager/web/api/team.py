@@ -5,14 +5,15 @@ import hashlib
 import logging
 from pathlib import Path
 from http import HTTPStatus
-from typing import List
+from typing import List, Literal
 from functools import wraps
 
 from quart import Blueprint, send_from_directory, request
-from quart_schema import validate_request, validate_response, DataSource
-from pydantic import validator
+from quart_schema import validate_request, validate_response, validate_querystring, DataSource
+from pydantic import BaseModel, validator
 
 from match_manager.web.api.login import requires_login
+from match_manager.web.etag import conditional
 from match_manager.model import team as model
 from match_manager.model import auth
 from match_manager import config
@@ -21,11 +22,17 @@ blue = Blueprint('teams', __name__, url_prefix='/api/teams')
 logger = logging.getLogger(__name__)
 
 
+class TeamListQuery(BaseModel):
+    include: Literal['managers'] | None = None
+
 @blue.route('/', methods=['GET'])
-@validate_response(List[model.TeamResponse])
-async def list_teams():
-    """lists all teams"""
-    return await model.get_teams()
+@conditional('teams', when=lambda: 'include' not in request.args)
+@validate_querystring(TeamListQuery)
+@validate_response(model.TeamResponseList)
+async def list_teams(query_args: TeamListQuery):
+    """lists all teams, with `?include=managers` including their managers"""
+    teams = await model.get_teams(include_managers=query_args.include == 'managers')
+    return model.TeamResponseList.model_construct(teams)
 
 
 @blue.route('/<int:team_id>', methods=['GET']) # type: ignore
@@ -15,6 +15,7 @@ import TopNavigation from "@cloudscape-design/components/top-navigation";
 import { applyMode, Mode } from "@cloudscape-design/global-styles";
 
 import { ToastContainer } from 'react-toastify';
+import { useLiveUpdates } from "./hooks/useLiveUpdates";
 
 const API_ENDPOINT = process.env.REACT_APP_API_ENDPOINT;
 
@@ -38,6 +39,9 @@ function App() {
   const [user_menu_or_login, set_user_menu_or_login] = useState({ ...login_button });
   const [is_admin_or_manager, set_is_admin_or_manager] = useState(false);
 
+  // keep the displayed data up to date, without polling
+  useLiveUpdates();
+
   // allow switching between dark- and light mode
   const [isDarkMode, setIsDarkMode] = useState(false);
   const toggleMode = () => {
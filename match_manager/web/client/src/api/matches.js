@@ -2,8 +2,9 @@ import axios from "axios";
 
 const API_ENDPOINT = process.env.REACT_APP_API_ENDPOINT;
 
-export const fetchMatches = async () => {
-  const { data } = await axios.get(`${API_ENDPOINT}/matches`);
+// returns a page of matches: { matches, next_cursor } -- pass next_cursor as `cursor` to get the next page
+export const fetchMatches = async (params = {}) => {
+  const { data } = await axios.get(`${API_ENDPOINT}/matches/`, { params });
   return data;
 };
 
@@ -0,0 +1,49 @@
+import { useEffect } from "react";
+import { useQueryClient } from "react-query";
+
+const API_ENDPOINT = process.env.REACT_APP_API_ENDPOINT;
+
+// subscribes to the server-sent live updates, and invalidates the affected queries instead of polling
+export const useLiveUpdates = (filters = {}) => {
+  const queryClient = useQueryClient();
+  const { season, group, team } = filters;
+
+  useEffect(() => {
+    const params = new URLSearchParams();
+    if (season) params.set("season", season);
+    if (group) params.set("group", group);
+    if (team) params.set("team", team);
+
+    const source = new EventSource(`${API_ENDPOINT}/live/events?${params}`, { withCredentials: true });
+    let connected_before = false;
+
+    source.onopen = () => {
+      // after a reconnect (e.g. when the server dropped us for being too slow), updates may have been missed
+      if (connected_before) {
+        queryClient.invalidateQueries();
+      }
+      connected_before = true;
+    };
+
+    source.onmessage = (message) => {
+      const { type, data } = JSON.parse(message.data);
+      switch (type.split(".")[0]) {
+        case "match":
+          queryClient.invalidateQueries(["matches"]);
+          queryClient.invalidateQueries(["match", data.id]);
+          break;
+        case "match_group":
+          queryClient.invalidateQueries(["group", data.id]);
+          queryClient.invalidateQueries(["matches"]);
+          break;
+        case "team":
+          queryClient.invalidateQueries("teams");
+          break;
+        default:
+          queryClient.invalidateQueries();
+      }
+    };
+
+    return () => source.close();
+  }, [queryClient, season, group, team]);
+};
@@ -1,8 +1,8 @@
 import { useMutation, useQuery, useQueryClient } from "react-query";
 import { activateMatch, createMatch, draftMatch, fetchMatch, fetchMatches, fetchMatchesInGroup, fetchMatchesInPlanning, fetchMatchesWaitingForResult, removeMatch, resetResult, setResult, suggestMatchTime, updateMatch } from "../api/matches";
 
-export const useMatches = () => {
-  return useQuery(["matches"], fetchMatches);
+export const useMatches = (params = {}) => {
+  return useQuery(["matches", "list", params], () => fetchMatches(params));
 };
 
 export const useMatchesInGroup = (group_id) => {
@@ -0,0 +1,94 @@
+"""
+Conditional GET requests: responses carry an ETag made from version counters of the collections they are built
+from, and a request with a matching If-None-Match is answered with 304 Not Modified -- without touching the
+database.
+
+The versions are counted per process. They are bumped by the listeners of the model change events: for changes
+made by this process right after their commit, before the api call that made them returns.
+
+Limits with several processes (e.g. web workers):
+- changes of other processes are only seen through the event bus (`database.event_bus` in the config), when
+  their notification arrives -- a few milliseconds after the commit. Without the event bus, they are not seen.
+- every process has its own ETags, so a client that is served by another process gets a full response.
+- to bound the staleness of missed notifications (and of a missing event bus), ETags also change every
+  `MAX_AGE` seconds -- as the reference caches expire.
+"""
+
+import functools
+import secrets
+import time
+from collections.abc import Callable
+from http import HTTPStatus
+
+from quart import Response, make_response, request
+
+from match_manager import events
+
+_epoch = secrets.token_hex(4)  # distinguishes the counters of this process from others, and from earlier runs
+_versions: dict[str, int] = {}
+
+COLLECTIONS = ('teams', 'maps', 'seasons', 'matches', 'standings', 'ratings')
+MAX_AGE = 600  # seconds
+
+
+def bump(*collections: str) -> None:
+    """mark the collections as modified"""
+    for name in collections:
+        _versions[name] = _versions.get(name, 0) + 1
+
+
+def etag_for(*collections: str) -> str:
+    window = int(time.time() // MAX_AGE)
+    return f'{_epoch}-{window}-' + '.'.join(f'{_versions.get(name, 0)}' for name in collections)
+
+
+def conditional(*collections: str, when: Callable[[], bool] = lambda: True):
+    """
+    Decorator for GET routes whose response depends only on the given collections -- to be placed directly
+    below the route, so that a 304 skips everything else. `when` can exclude some requests, e.g. if they include
+    data from elsewhere.
+    """
+    for name in collections:
+        assert name in COLLECTIONS, f'unknown collection {name}'
+
+    def _decorator(f):
+        @functools.wraps(f)
+        async def _conditional(*args, **kwargs):
+            if not when():
+                return await f(*args, **kwargs)
+
+            # determine the version before loading the data -- if it is modified meanwhile, the next request
+            # simply does not match
+            tag = etag_for(*collections)
+            if request.if_none_match.contains_weak(tag):
+                response = Response('', HTTPStatus.NOT_MODIFIED)
+            else:
+                response = await make_response(await f(*args, **kwargs))
+                if response.status_code != HTTPStatus.OK:
+                    return response
+
+            response.set_etag(tag, weak=True)
+            response.cache_control.no_cache = True  # always revalidate
+            return response
+        return _conditional
+    return _decorator
+
+
+"""
+bump the versions on changes
+"""
+
+def _bump_on(source: events.EventGroup | events.Event, *collections: str) -> None:
+    def _bump(_data) -> None:
+        bump(*collections)
+    source.add_listener(_bump)
+
+
+_bump_on(events.team, 'teams', 'seasons')  # groups include their teams
+_bump_on(events.game_map, 'maps')
+_bump_on(events.season, 'seasons')
+_bump_on(events.match_group, 'seasons')
+_bump_on(events.match, 'matches')
+_bump_on(events.fixtures_created, 'matches')
+_bump_on(events.standings_rebuilt, 'standings')
+_bump_on(events.ratings_recomputed, 'ratings')
@@ -0,0 +1,172 @@
+"""
+Fan-out of model events to the browsers connected to the live-update stream.
+
+Every event is encoded once, and put into the bounded queue of every subscriber that is interested in it.
+Subscribers can filter by season, group and team. A subscriber that does not keep up and lets its queue run
+full is evicted, instead of slowing down everyone else or buffering without limit -- the client reconnects
+and reloads its data.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import TypeVar
+
+from match_manager import events
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+QUEUE_SIZE = 100  # messages buffered per subscriber before it is evicted
+
+# bulk edits (e.g. of all matches in a group) update the same entities in quick succession -- send only the latest
+# update per entity, once it is quiet for a moment, or at the latest after the max delay
+COALESCE_WINDOW = 0.25  # seconds
+COALESCE_MAX_DELAY = 1.0
+
+# topics of a message, e.g. {'season': {1}, 'team': {3, 4}}
+Topics = dict[str, frozenset[int]]
+
+
+class Subscription:
+    """the queue of a single subscriber, and its filters"""
+
+    def __init__(self, filters: dict[str, int]):
+        self.filters = filters
+        self.queue = asyncio.Queue[str | None](maxsize=QUEUE_SIZE)
+        self.evicted = False
+
+    def wants(self, topics: Topics) -> bool:
+        """
+        Filters only exclude messages that concern _other_ seasons/groups/teams: a message without a season,
+        e.g. the update of a team, is delivered to subscribers of any season.
+        """
+        return all(
+            kind not in topics or value in topics[kind]
+            for kind, value in self.filters.items()
+        )
+
+    async def get(self) -> list[str] | None:
+        """wait for the next messages -- returns all that are available, or None when the stream ended"""
+        frames = [await self.queue.get()]
+        while not self.queue.empty():
+            frames.append(self.queue.get_nowait())
+
+        if None in frames:
+            return None
+        return frames  # type: ignore
+
+
+class LiveBroker:
+    """distributes messages to all subscribers"""
+
+    def __init__(self):
+        self._subscribers = set[Subscription]()
+        self._published = 0
+        self._delivered = 0
+        self._evicted = 0
+
+    @contextmanager
+    def subscribe(self, **filters: int | None) -> Iterator[Subscription]:
+        """subscribe for the duration of the context, filtering by the given topics, e.g. `season=1`"""
+        sub = Subscription({kind: value for kind, value in filters.items() if value is not None})
+        self._subscribers.add(sub)
+        try:
+            yield sub
+        finally:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type: str, data, topics: Topics) -> None:
+        """encode a message (event data, a dataclass) once and queue it for all interested subscribers"""
+        frame = 'data: ' + json.dumps({'type': event_type, 'data': dataclasses.asdict(data)}) + '\n\n'
+        self._published += 1
+
+        for sub in list(self._subscribers):
+            if not sub.wants(topics):
+                continue
+            try:
+                sub.queue.put_nowait(frame)
+                self._delivered += 1
+            except asyncio.QueueFull:
+                self._evict(sub)
+
+    def _evict(self, sub: Subscription) -> None:
+        """drop the pending messages of a slow subscriber, and end its stream"""
+        logger.info('evicting slow live-update subscriber %s', sub.filters)
+        self._subscribers.discard(sub)
+        self._evicted += 1
+        sub.evicted = True
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    def close(self) -> None:
+        """end the streams of all subscribers, e.g. on shutdown"""
+        for sub in list(self._subscribers):
+            self._subscribers.discard(sub)
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait(None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'subscribers': len(self._subscribers),
+            'published': self._published,
+            'delivered': self._delivered,
+            'evicted': self._evicted,
+        }
+
+
+broker = LiveBroker()
+
+
+"""
+forward the model events to the broker
+"""
+
+def _ids(*values: int | None) -> frozenset[int]:
+    return frozenset(v for v in values if v is not None)
+
+
+def _forward(event: events.Event[T], event_type: str, topics: Callable[[T], Topics], coalesce: bool = False) -> None:
+    async def _publish(data: T) -> None:
+        broker.publish(event_type, data, topics(data))
+
+    if coalesce:
+        _publish.__qualname__ = f'publish:{event_type}'
+        event.add_handler(events.coalesce(lambda d: d.id, COALESCE_WINDOW, COALESCE_MAX_DELAY)(_publish))  # type: ignore
+    else:
+        event.add_handler(_publish)
+
+
+def _match_topics(m: events.MatchData) -> Topics:
+    return {'season': _ids(m.season_id), 'group': _ids(m.group_id), 'team': _ids(m.team_a_id, m.team_b_id)}
+
+def _group_topics(g: events.MatchGroupData) -> Topics:
+    return {'season': _ids(g.season_id), 'group': _ids(g.id)}
+
+def _fixtures_topics(f: events.FixturesData) -> Topics:
+    return {'season': _ids(f.season_id), 'group': _ids(f.group_id), 'team': _ids(*f.team_ids)}
+
+def _team_topics(t: events.TeamData) -> Topics:
+    return {'team': _ids(t.id)}
+
+def _season_topics(s: events.SeasonData) -> Topics:
+    return {'season': _ids(s.id)}
+
+
+_forward(events.match_created, 'match.created', _match_topics)
+_forward(events.match_updated, 'match.updated', _match_topics, coalesce=True)
+_forward(events.match_deleted, 'match.deleted', _match_topics)
+_forward(events.fixtures_created, 'fixtures.created', _fixtures_topics)
+_forward(events.match_group_created, 'match_group.created', _group_topics)
+_forward(events.match_group_updated, 'match_group.updated', _group_topics, coalesce=True)
+_forward(events.match_group_deleted, 'match_group.deleted', _group_topics)
+_forward(events.team_created, 'team.created', _team_topics)
+_forward(events.team_updated, 'team.updated', _team_topics, coalesce=True)
+_forward(events.team_deleted, 'team.deleted', _team_topics)
+_forward(events.season_created, 'season.created', _season_topics)
@@ -0,0 +1,103 @@
+"""
+Benchmark of concurrent api requests against an artificially slow database: the queries running in the database
+worker pool, compared to running them right on the event loop (as before the pool was introduced).
+
+Besides the throughput, it reports the longest stall of the event loop -- which also drives the discord bot and
+its gateway heartbeat.
+
+Run from the directory with the config.toml, e.g.:
+
+    python -m scripts.bench_db_pool --requests 64 --delay 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import peewee as pw
+
+from match_manager import model, web
+from match_manager.model.db import _executor
+from match_manager.model.db.map import Map
+from match_manager.model.db.match import Match
+from match_manager.model.db.season import Season, MatchGroup
+from match_manager.model.db.team import Team
+
+logging.disable(logging.WARNING)
+
+
+class SlowDatabase(pw.SqliteDatabase):
+    """every statement takes (at least) `delay` seconds, like on a busy or remote database server"""
+    delay = 0.0
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        time.sleep(self.delay)
+        return super().execute_sql(sql, params, *args, **kwargs)
+
+
+async def _run_on_loop(fn, *args, **kwargs):
+    """the behaviour before the worker pool: blocking queries on the event loop"""
+    with model.db.proxy.connection_context():
+        return fn(*args, **kwargs)
+
+
+async def _measure(num_requests: int) -> tuple[float, float]:
+    """throughput in requests per second, and the longest stall of the event loop in seconds"""
+    client = web.app.test_client()
+    max_stall = 0.0
+    done = False
+
+    async def _ticker():
+        nonlocal max_stall
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, time.perf_counter() - t)
+
+    ticker = asyncio.create_task(_ticker())
+    t = time.perf_counter()
+    responses = await asyncio.gather(*(client.get('/api/matches/?limit=20') for _ in range(num_requests)))
+    elapsed = time.perf_counter() - t
+    done = True
+    await ticker
+
+    assert all(r.status_code == 200 for r in responses), {r.status_code for r in responses}
+    return num_requests / elapsed, max_stall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--requests', type=int, default=64, help='number of concurrent requests')
+    parser.add_argument('--delay', type=float, default=0.05, help='seconds per database statement')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix='.db') as f:
+        database = SlowDatabase(f.name, check_same_thread=False)
+        model.db.proxy.initialize(database)
+        database.create_tables([Team, Season, MatchGroup, Map, Match])
+        with database.atomic():
+            Team.insert_many([{'name': f'team {i}', 'tag': f'T{i}'} for i in range(20)]).execute()
+            Season.create(name='season')
+            MatchGroup.create(name='group', season=1)
+            Match.insert_many([{'group': 1, 'team_a': 1 + i % 20, 'team_b': 1 + (i + 1) % 20}
+                               for i in range(200)]).execute()
+        database.close()
+        SlowDatabase.delay = args.delay
+
+        pooled = asyncio.run(_measure(args.requests))
+        run, _executor.run = _executor.run, _run_on_loop
+        try:
+            on_loop = asyncio.run(_measure(args.requests))
+        finally:
+            _executor.run = run
+        model.db.shutdown()
+
+    print(f'{args.requests} concurrent requests, {1000 * args.delay:.0f} ms per statement')
+    for name, (throughput, stall) in (('on the event loop', on_loop), ('worker pool', pooled)):
+        print(f'  {name:18} {throughput:7.1f} requests/s, event loop stalled up to {1000 * stall:6.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
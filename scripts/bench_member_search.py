@@ -0,0 +1,63 @@
+"""
+Benchmark of the member search index at 50k members, compared to the linear scan it replaced -- and a check that
+both find the same members.
+
+Run from the directory with the config.toml, e.g.:
+
+    python -m scripts.bench_member_search --members 50000
+"""
+
+import argparse
+import random
+import time
+import timeit
+
+from match_manager.model.user import MemberSearchIndex
+
+SYLLABLES = ['ka', 'to', 'ri', 'mo', 'shi', 'den', 'ver', 'lux', 'ar', 'el', 'an', 'kor', 'zu', 'pan', 'ther', 'wolf',
+             'ace', '_', 'x']
+
+
+def _random_name(rng: random.Random) -> str:
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5)))
+    if rng.random() < 0.3:
+        name += ' ' + ''.join(rng.choice(SYLLABLES) for _ in range(2))
+    if rng.random() < 0.3:
+        name += str(rng.randint(0, 999))
+    return name.capitalize()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--members', type=int, default=50_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    members = [(i, _random_name(rng)) for i in range(args.members)]
+
+    def _scan(term: str, limit: int = 10) -> list[int]:
+        """the previous search: a substring test on every member"""
+        term = term.lower()
+        return [i for i, name in members if term in name.lower()][:limit]
+
+    index = MemberSearchIndex()
+    t = time.perf_counter()
+    index.build(members)
+    print(f'{args.members} members, index built in {1000 * (time.perf_counter() - t):.0f} ms')
+
+    for term in ['k', 'ka', 'kor', 'wolfpan', 'ther ace', 'xyzq', members[123][1][:6]]:
+        assert set(index.search(term, args.members)) == set(_scan(term, args.members)), term
+        indexed = timeit.timeit(lambda: index.search(term), number=200) / 200
+        scanned = timeit.timeit(lambda: _scan(term), number=20) / 20
+        print(f'  {term!r:12} scan {1000 * scanned:7.2f} ms   index {1000 * indexed:6.3f} ms')
+
+    t = time.perf_counter()
+    for i in range(1000):
+        index.add(i, _random_name(rng))
+    for i in range(1000, 2000):
+        index.remove(i)
+    print(f'1000 renames and 1000 removals in {1000 * (time.perf_counter() - t):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
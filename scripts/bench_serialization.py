@@ -0,0 +1,85 @@
+"""
+Microbenchmark of the list responses for matches, teams and maps: the trusted fast path (`.dicts()` rows,
+`model_construct`, one json dump of a RootModel list) compared to the previous conversion (model instances,
+`model_to_dict`, validated construction of every entry, and validation of the whole list again on the way out).
+
+Run from the directory with the config.toml, e.g.:
+
+    python -m scripts.bench_serialization --rows 10000
+"""
+
+import argparse
+import json
+import logging
+import timeit
+
+import peewee as pw
+from playhouse.shortcuts import model_to_dict
+from pydantic import BaseModel, TypeAdapter
+
+from match_manager import model
+from match_manager.model import match, team, map as game_map
+from match_manager.model.db.map import Map
+from match_manager.model.db.match import Match, MatchCapScore, MatchState, Faction
+from match_manager.model.db.season import Season, MatchGroup
+from match_manager.model.db.team import Team
+
+logging.disable(logging.WARNING)
+
+
+def _fill(database: pw.Database, rows: int) -> None:
+    with database.atomic():
+        for batch in pw.chunked(({'name': f'team {i}', 'tag': f'T{i}', 'description': 'a team'}
+                                 for i in range(rows)), 1000):
+            Team.insert_many(batch).execute()
+        for batch in pw.chunked(({'short_name': f'map{i}', 'full_name': f'Map {i}'} for i in range(rows)), 1000):
+            Map.insert_many(batch).execute()
+        Season.create(name='season')
+        MatchGroup.create(name='group', season=1)
+        for batch in pw.chunked(({'group': 1, 'team_a': 1 + i % 100, 'team_b': 2 + i % 100, 'winner': 1 + i % 100,
+                                  'match_time': 1_700_000_000 + 60 * i, 'game_map': 1 + i % 20,
+                                  'team_a_faction': Faction.AXIS, 'winner_caps': MatchCapScore.WIN_4_1,
+                                  'state': MatchState.COMPLETED} for i in range(rows)), 1000):
+            Match.insert_many(batch).execute()
+
+
+def _previous(response: type[BaseModel], query: pw.ModelSelect) -> bytes:
+    """the conversion before the fast path"""
+    entries = [response(**model_to_dict(row, recurse=False)) for row in query]
+    adapter = TypeAdapter(list[response])  # type: ignore
+    return adapter.dump_json(adapter.validate_python([e.model_dump() for e in entries]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--rows', type=int, default=10_000, help='number of matches, teams and maps')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    database = pw.SqliteDatabase(':memory:')
+    model.db.proxy.initialize(database)
+    database.create_tables([Team, Season, MatchGroup, Map, Match])
+    _fill(database, args.rows)
+
+    cases = {
+        'matches': (match.MatchResponse, match.MatchResponseList, Match.select().order_by(Match.id),
+                    match._match_responses),  # pylint: disable=protected-access
+        'teams': (team.TeamResponse, team.TeamResponseList, Team.select().order_by(Team.id),
+                  lambda q: [team.TeamResponse.from_row(row) for row in q.dicts()]),
+        'maps': (game_map.MapResponse, game_map.MapResponseList, Map.select().order_by(Map.id),
+                 lambda q: [game_map.MapResponse.from_row(row) for row in q.dicts()]),
+    }
+
+    print(f'{args.rows} rows, mean of {args.repeat} runs')
+    for name, (response, response_list, query, fast) in cases.items():
+        def _fast() -> bytes:
+            return response_list(fast(query.clone())).model_dump_json().encode()
+
+        assert json.loads(_fast()) == json.loads(_previous(response, query.clone())), f'{name}: different output'
+        before = timeit.timeit(lambda: _previous(response, query.clone()), number=args.repeat) / args.repeat
+        after = timeit.timeit(_fast, number=args.repeat) / args.repeat
+        print(f'  {name:8} {1000 * before:6.0f} ms -> {1000 * after:6.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
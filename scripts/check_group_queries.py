@@ -0,0 +1,151 @@
+"""
+Regression check for the season and group reads: the number of queries must not grow with the number of groups,
+and only the rows of the requested season or group may be read -- on a data set of 50 seasons with 20 groups of
+16 teams each.
+
+Run from the directory with the config.toml, e.g.:
+
+    python -m scripts.check_group_queries
+
+Exits with 1 if any of the checks fails.
+"""
+
+import asyncio
+import logging
+import sys
+import tempfile
+
+import peewee as pw
+
+from match_manager import model
+from match_manager.model import auth, season
+from match_manager.model.db.audit_event import AuditEvent
+from match_manager.model.db.season import Season, MatchGroup, TeamInGroup
+from match_manager.model.db.standing import Standing
+from match_manager.model.db.team import Team
+
+logging.disable(logging.WARNING)
+
+SEASONS = 50
+GROUPS = 20  # per season
+TEAMS = 16   # per group
+
+admin = auth.User(id='1', name='admin', is_admin=True, is_manager_for_teams=[])
+
+
+class _CountingCursor:
+    """forwards to a db-api cursor, and counts the rows fetched from it"""
+    def __init__(self, cursor, counter: 'CountingDatabase'):
+        self._cursor = cursor
+        self._counter = counter
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._counter.rows += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._counter.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingDatabase(pw.SqliteDatabase):
+    """counts the queries (SELECTs) and the rows they returned"""
+    queries = 0
+    rows = 0
+
+    def reset(self) -> None:
+        self.queries = self.rows = 0
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        cursor = super().execute_sql(sql, params, *args, **kwargs)
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries += 1
+            return _CountingCursor(cursor, self)
+        return cursor
+
+
+def _fill() -> None:
+    num_groups = SEASONS * GROUPS
+    with model.db.proxy.atomic():
+        Team.insert_many([{'name': f'team {i}', 'tag': f'T{i}'} for i in range(num_groups * TEAMS // 2)]).execute()
+        Season.insert_many([{'name': f'season {i}'} for i in range(SEASONS)]).execute()
+        MatchGroup.insert_many([{'name': f'group {i}', 'season': 1 + i // GROUPS} for i in range(num_groups)]).execute()
+        for batch in pw.chunked(({'group': 1 + i // TEAMS, 'team': 1 + i % (num_groups * TEAMS // 2)}
+                                 for i in range(num_groups * TEAMS)), 1000):
+            TeamInGroup.insert_many(batch).execute()
+
+
+def _add_groups(season_id: int, num_groups: int) -> None:
+    """more groups (with their teams) in a season"""
+    with model.db.proxy.atomic():
+        for _ in range(num_groups):
+            group = MatchGroup.create(name='extra group', season=season_id)
+            TeamInGroup.insert_many([{'group': group, 'team': t} for t in range(1, TEAMS + 1)]).execute()
+
+
+async def _measure(database: CountingDatabase, call) -> tuple[int, int]:
+    database.reset()
+    await call()
+    return database.queries, database.rows
+
+
+async def main(path: str) -> int:
+    # a file: the database workers use connections of their own
+    database = CountingDatabase(path, check_same_thread=False)
+    model.db.proxy.initialize(database)
+    database.create_tables([Team, Season, MatchGroup, TeamInGroup, Standing, AuditEvent])
+    await model.db.run(_fill)
+
+    checks: list[tuple[str, bool]] = []
+
+    def check(name: str, ok: bool) -> None:
+        checks.append((name, ok))
+        print(f'{"ok  " if ok else "FAIL"} {name}')
+
+    # get_season: constant number of queries, rows of the requested season only
+    results = {}
+    current = GROUPS
+    for groups in (GROUPS, 2 * GROUPS, 4 * GROUPS):
+        await model.db.run(_add_groups, 1, groups - current)
+        current = groups
+        queries, rows = await _measure(database, lambda: season.get_season(1))
+        results[groups] = queries
+        print(f'     get_season with {groups} groups: {queries} queries, {rows} rows')
+        check(f'get_season reads only the season, its {groups} groups and their teams',
+              rows == 1 + groups + groups * TEAMS)
+    check('get_season: the number of queries does not grow with the groups', len(set(results.values())) == 1)
+
+    # get_match_group: a single group
+    queries, rows = await _measure(database, lambda: season.get_match_group(GROUPS + 1))
+    print(f'     get_match_group: {queries} queries, {rows} rows')
+    check('get_match_group reads only the group and its teams', rows == 1 + TEAMS)
+
+    # update_match_group: the response does not load the teams one by one
+    counts = set()
+    for num_teams in (4, TEAMS):
+        update = season.UpdateMatchGroupData(teams=list(range(1, num_teams + 1)))
+        queries, _ = await _measure(database, lambda: season.update_match_group(GROUPS + 2, update, admin))
+        print(f'     update_match_group with {num_teams} teams: {queries} queries')
+        counts.add(queries)
+    check('update_match_group: the number of queries does not grow with the teams', len(counts) == 1)
+
+    model.db.shutdown()
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == '__main__':
+    with tempfile.NamedTemporaryFile(suffix='.db') as f:
+        sys.exit(asyncio.run(main(f.name)))
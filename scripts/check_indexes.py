@@ -0,0 +1,121 @@
+"""
+Checks that the hot queries use the indexes declared on the models: fills a database with a large synthetic data
+set, and looks for the expected index in the query plan of each query.
+
+Run from the directory with the config.toml, e.g.:
+
+    python -m scripts.check_indexes                                   # sqlite, in memory
+    python -m scripts.check_indexes postgresql://postgres@/indexcheck # an empty postgres database
+
+Exits with 1 if any of the queries does not use its index.
+"""
+
+import argparse
+import sys
+import time
+
+import peewee as pw
+from playhouse.db_url import connect
+
+from match_manager import model
+from match_manager.model.db.audit_event import AuditEvent
+from match_manager.model.db.map import Map
+from match_manager.model.db.match import Match, MatchState
+from match_manager.model.db.season import Season, MatchGroup, TeamInGroup
+from match_manager.model.db.team import Team, TeamManager
+
+MODELS = [Team, TeamManager, Season, MatchGroup, TeamInGroup, Map, Match, AuditEvent]
+
+CHUNK_SIZE = 1000
+START = 1_700_000_000  # timestamp of the first match and audit event
+
+
+def _fill(database: pw.Database, num_matches: int) -> None:
+    num_teams = max(num_matches // 150, 16)
+    num_groups = max(num_matches // 300, 1)
+
+    def _insert(table: type[pw.Model], rows) -> None:
+        for batch in pw.chunked(rows, CHUNK_SIZE):
+            table.insert_many(batch).execute()
+
+    def _state(i: int) -> MatchState:
+        # mostly history, some matches in planning and waiting for their results
+        return {0: MatchState.PLANNING, 1: MatchState.ACTIVE}.get(i % 100, MatchState.COMPLETED)
+
+    with database.atomic():
+        _insert(Team, ({'name': f'team {i}', 'tag': f'T{i}'} for i in range(num_teams)))
+        _insert(TeamManager, ({'discord_user_id': str(i), 'team': 1 + i % num_teams} for i in range(3 * num_teams)))
+        _insert(Season, ({'name': f'season {i}'} for i in range(num_groups // 20 + 1)))
+        _insert(MatchGroup, ({'name': f'group {i}', 'season': 1 + i // 20} for i in range(num_groups)))
+        _insert(TeamInGroup, ({'group': 1 + i // 16, 'team': 1 + i % num_teams} for i in range(16 * num_groups)))
+        _insert(Match, ({'group': 1 + i % num_groups, 'team_a': 1 + i % num_teams,
+                         'team_b': 1 + (7 * i + 1) % num_teams, 'match_time': START + 60 * i, 'state': _state(i)}
+                        for i in range(num_matches)))
+        _insert(AuditEvent, ({'author': str(i % 500), 'timestamp': START + i, 'event_type': 'match.updated',
+                              'event_description': f'updated match {i}'} for i in range(num_matches)))
+
+
+def _hot_queries() -> dict[str, tuple[pw.Query, str]]:
+    """the queries of the model operations, with the index each of them should use"""
+    return {
+        'matches in planning': (
+            Match.select().where(Match.state == MatchState.PLANNING),
+            'match_state_match_time'),
+        'matches waiting for a result': (
+            Match.select().where(Match.state == MatchState.ACTIVE),
+            'match_state_match_time'),
+        'schedule of a team (team a)': (
+            Match.select().where(Match.team_a == 5).order_by(Match.match_time),
+            'match_team_a_id_match_time'),
+        'schedule of a team (team b)': (
+            Match.select().where(Match.team_b == 5).order_by(Match.match_time),
+            'match_team_b_id_match_time'),
+        'audit log page': (
+            AuditEvent.select().where(AuditEvent.timestamp < START + 1000)
+                      .order_by(AuditEvent.timestamp.desc()).limit(10),
+            'auditevent_timestamp'),
+        'teams managed by a user': (
+            TeamManager.select(TeamManager.team).where(TeamManager.discord_user_id == '42'),
+            'teammanager_discord_user_id'),
+        'teams in a group': (
+            TeamInGroup.select().where(TeamInGroup.group == 3),
+            'teamingroup_group_id_team_id'),
+    }
+
+
+def _plan(database: pw.Database, query: pw.Query) -> str:
+    sql, params = query.sql()
+    explain = 'EXPLAIN QUERY PLAN ' if isinstance(database, pw.SqliteDatabase) else 'EXPLAIN '
+    return '\n'.join(str(row[-1]) for row in database.execute_sql(explain + sql, params))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('database', nargs='?', default='sqlite:///:memory:',
+                        help='url of an empty database, default: sqlite in memory')
+    parser.add_argument('--matches', type=int, default=300_000, help='number of matches and audit events')
+    args = parser.parse_args()
+
+    database = connect(args.database)
+    model.db.proxy.initialize(database)
+    database.create_tables(MODELS)
+
+    t = time.perf_counter()
+    _fill(database, args.matches)
+    database.execute_sql('ANALYZE')
+    print(f'filled the database with {args.matches} matches in {time.perf_counter() - t:.1f}s')
+
+    failed = 0
+    for name, (query, index) in _hot_queries().items():
+        plan = _plan(database, query)
+        ok = index in plan
+        failed += not ok
+        print(f'{"ok  " if ok else "FAIL"} {name}: {plan.splitlines()[0]}')
+        if not ok:
+            print(f'     expected {index} in the plan:\n     ' + plan.replace('\n', '\n     '))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())